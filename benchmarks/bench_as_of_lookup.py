@@ -0,0 +1,74 @@
+"""Курс на момент времени: временной индекс пары против просмотра сегментов.
+
+    poetry run python benchmarks/bench_as_of_lookup.py [--days 730] [--per-day 48] [--lookups 200]
+
+Строится синтетическая история нескольких пар за --days суток и сравнивается
+поиск курса на случайный момент через HistoryStore.rate_at (двоичный поиск
+по index/<PAIR>.idx) и прямым просмотром суточных сегментов назад от этого
+момента до первой записи пары.
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from valutatrade_hub.parser_service.history import DAY, HistoryRecord, HistoryStore
+
+
+PAIRS = ["BTC_USD", "ETH_USD", "EUR_USD", "RUB_USD"]
+START = 1_700_000_000.0
+
+
+def scan_back(history: HistoryStore, pair: str, ts: float) -> tuple[float, float] | None:
+    # без индекса: сегменты просматриваются от момента ts к началу истории
+    day_start = ts
+    while day_start >= START - DAY:
+        found = None
+        for r in history.read_range(day_start - DAY, min(ts, day_start), pair):
+            found = (r.rate, r.timestamp)
+        if found is not None:
+            return found
+        day_start -= DAY
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--per-day", type=int, default=48)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        history = HistoryStore(tmp)
+        step = DAY / args.per_day
+        for day in range(args.days):
+            history.append([
+                HistoryRecord(START + day * DAY + k * step, pair, rng.uniform(1, 2), "Bench")
+                for k in range(args.per_day)
+                for pair in PAIRS
+            ])
+
+        end = START + args.days * DAY
+        moments = [(rng.choice(PAIRS), rng.uniform(START, end)) for _ in range(args.lookups)]
+
+        started = time.perf_counter()
+        indexed = [history.rate_at(pair, ts) for pair, ts in moments]
+        index_time = (time.perf_counter() - started) / args.lookups
+
+        sample = moments[: max(1, args.lookups // 10)]
+        started = time.perf_counter()
+        scanned = [scan_back(history, pair, ts) for pair, ts in sample]
+        scan_time = (time.perf_counter() - started) / len(sample)
+
+        assert scanned == indexed[: len(sample)]
+
+    records = args.days * args.per_day * len(PAIRS)
+    print(f"записей в истории: {records}, пар: {len(PAIRS)}")
+    print(f"индекс (bisect):     {index_time * 1e6:9.1f} мкс на поиск")
+    print(f"просмотр сегментов:  {scan_time * 1e6:9.1f} мкс на поиск ({scan_time / index_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
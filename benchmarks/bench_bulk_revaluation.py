@@ -0,0 +1,105 @@
+"""Переоценка всех портфелей: балансы в float64 против целых единиц хранения (int64).
+
+    poetry run python benchmarks/bench_bulk_revaluation.py [--users 200000] [--seconds 2]
+
+Сравнивается пропускная способность BulkValuation.revalue на одинаковых
+синтетических портфелях с переоценкой балансов во float64. Обе реализации
+заранее, один раз на загрузку, считают всё, что не зависит от курсов
+(маску валют с балансами и суммы по столбцам), поэтому сравнивается только
+сама переоценка. Целочисленная версия не быстрее: она умножает точную
+float64-копию единиц и дополнительно округляет итоги до единиц базовой
+валюты, — её смысл в точности, а не в скорости. В конце показывается, как
+расходятся итоги после многократных сделок при хранении балансов во float.
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from valutatrade_hub.core.currencies import get_currency
+from valutatrade_hub.core.rate_matrix import RateMatrix
+from valutatrade_hub.core.valuation import BulkValuation
+
+
+RATES = {
+    "EUR_USD": 1.0786,
+    "RUB_USD": 0.01016,
+    "BTC_USD": 59337.21,
+    "ETH_USD": 2726.45,
+    "SOL_USD": 145.12,
+}
+
+
+class FixedRates:
+    def __init__(self) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        self.matrix = RateMatrix.from_pairs(
+            {pair: {"rate": rate, "updated_at": now} for pair, rate in RATES.items()}
+        )
+
+    def get_matrix(self) -> RateMatrix:
+        return self.matrix
+
+
+def revaluations_per_second(fn, seconds: float) -> float:
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    codes = ["USD", "EUR", "RUB", "BTC", "ETH", "SOL"]
+    scales = np.array([10 ** get_currency(c).decimals for c in codes], dtype=np.int64)
+    rng = np.random.default_rng(42)
+
+    # балансы в «человеческих» единицах с точностью валюты
+    whole = rng.integers(0, 10_000, size=(args.users, len(codes)))
+    fraction = rng.integers(0, 100, size=(args.users, len(codes)))
+    units = whole * scales + fraction * (scales // 100)
+
+    valuation = BulkValuation(FixedRates())
+    valuation.set_units(np.arange(1, args.users + 1, dtype=np.int64), codes, units)
+
+    balances = units / scales
+    # прежняя реализация revalue() с балансами во float64 — с той же предварительной подготовкой
+    held = (balances != 0).any(axis=0)
+    column_totals = balances.sum(axis=0)
+
+    def float_revalue():
+        vector = valuation.rate_vector("USD")
+        missing = np.isnan(vector) & held
+        if missing.any():
+            raise RuntimeError("нет курса")
+        vector = np.nan_to_num(vector)
+        return balances @ vector, column_totals * vector
+
+    def int_revalue():
+        return valuation.revalue("USD")
+
+    float_rate = revaluations_per_second(float_revalue, args.seconds)
+    int_rate = revaluations_per_second(int_revalue, args.seconds)
+
+    print(f"пользователей: {args.users}, валют: {len(codes)}")
+    print(f"float64 балансы:  {float_rate:8.1f} переоценок/с")
+    print(f"int64 единицы:    {int_rate:8.1f} переоценок/с ({int_rate / float_rate:.2f}x)")
+
+    # дрейф: 1000 покупок по 0.1 и продажа 100
+    drift = 0.0
+    for _ in range(1000):
+        drift += 0.1
+    drift -= 100
+    drift_units = 1000 * 10 - 100 * 100
+    print(f"остаток после 1000×0.1 − 100: float {drift!r}, int {drift_units} центов")
+
+
+if __name__ == "__main__":
+    main()
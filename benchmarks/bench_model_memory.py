@@ -0,0 +1,117 @@
+"""Память на пользователя: модели с __dict__ против моделей с __slots__.
+
+    poetry run python benchmarks/bench_model_memory.py [--users 100000] [--wallets 3]
+
+«До» — прежние модели (атрибуты в __dict__, проверки в сеттерах, копия
+записи хранилища перед разбором), «после» — текущие User/Portfolio/Wallet
+из core/models.py, которые строятся прямо из записей хранилища.
+"""
+import argparse
+import copy
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+from valutatrade_hub.core.models import Portfolio, User
+
+
+CODES = ["USD", "EUR", "BTC", "ETH", "SOL", "RUB"]
+
+
+class DictUser:
+    def __init__(self, user_id, username, hashed_password, salt, registration_date):
+        self._user_id = user_id
+        self._username = username
+        self._hashed_password = hashed_password
+        self._salt = salt
+        self._registration_date = registration_date
+
+
+class DictWallet:
+    def __init__(self, currency_code: str, units: int):
+        self._currency_code = currency_code
+        self._units = units
+
+
+class DictPortfolio:
+    def __init__(self, user_id: int):
+        self._user_id = user_id
+        self._wallets = {}
+
+
+def make_records(users: int, wallets: int) -> list[tuple[dict, dict]]:
+    records = []
+    for i in range(1, users + 1):
+        user = {
+            "user_id": i,
+            "username": f"user{i}",
+            "hashed_password": "scrypt$n=16384,r=8,p=1$" + "ab" * 32,
+            "salt": "cd" * 16,
+            "registration_date": "2026-10-01T12:00:00",
+        }
+        portfolio = {
+            "user_id": i,
+            "wallets": {code: {"units": i * 100 + k} for k, code in enumerate(CODES[:wallets])},
+            "version": 1,
+        }
+        records.append((user, portfolio))
+    return records
+
+
+def load_before(records):
+    result = []
+    for user_record, portfolio_record in records:
+        u = DictUser(
+            user_record["user_id"],
+            user_record["username"],
+            user_record["hashed_password"],
+            user_record["salt"],
+            datetime.fromisoformat(user_record["registration_date"]),
+        )
+        data = copy.deepcopy(portfolio_record)
+        p = DictPortfolio(data["user_id"])
+        for code, w in data["wallets"].items():
+            p._wallets[code] = DictWallet(code, w["units"])
+        result.append((u, p))
+    return result
+
+
+def load_after(records):
+    return [
+        (User.from_record(user_record), Portfolio.from_record(portfolio_record))
+        for user_record, portfolio_record in records
+    ]
+
+
+def measure(loader, records) -> tuple[float, float]:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    models = loader(records)
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del models
+    return size, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--wallets", type=int, default=3)
+    args = parser.parse_args()
+
+    records = make_records(args.users, min(args.wallets, len(CODES)))
+
+    before, before_time = measure(load_before, records)
+    after, after_time = measure(load_after, records)
+
+    print(f"пользователей: {args.users}, кошельков у каждого: {args.wallets}")
+    print(f"до (__dict__):    {before / args.users:8.0f} байт/пользователь, загрузка {before_time:.2f} с")
+    print(f"после (__slots__): {after / args.users:8.0f} байт/пользователь, загрузка {after_time:.2f} с")
+    print(f"экономия памяти: {1 - after / before:.0%}")
+
+
+if __name__ == "__main__":
+    main()
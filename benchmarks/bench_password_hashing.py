@@ -0,0 +1,51 @@
+"""Пропускная способность входа (проверок пароля в секунду) для разных параметров KDF.
+
+    poetry run python benchmarks/bench_password_hashing.py [--seconds 2]
+"""
+import argparse
+import secrets
+import time
+
+from valutatrade_hub.core.models import (
+    PasswordHasher,
+    Pbkdf2Hasher,
+    ScryptHasher,
+    Sha256Hasher,
+)
+
+
+PARAMETER_SETS: list[PasswordHasher] = [
+    Sha256Hasher(),
+    Pbkdf2Hasher(iterations=100_000),
+    Pbkdf2Hasher(iterations=600_000),
+    ScryptHasher(n=2 ** 14, r=8, p=1),
+    ScryptHasher(n=2 ** 15, r=8, p=1),
+    ScryptHasher(n=2 ** 16, r=8, p=1),
+]
+
+
+def logins_per_second(hasher: PasswordHasher, seconds: float) -> float:
+    salt = secrets.token_hex(16)
+    encoded = hasher.encode("correct horse", salt)
+
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        hasher.verify("correct horse", salt, encoded)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'hasher':<45} {'logins/sec':>12}")
+    for hasher in PARAMETER_SETS:
+        rate = logins_per_second(hasher, args.seconds)
+        print(f"{hasher!r:<45} {rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
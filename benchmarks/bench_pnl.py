@@ -0,0 +1,117 @@
+"""P&L: инкрементальная себестоимость против пересчёта по истории сделок.
+
+    poetry run python benchmarks/bench_pnl.py [--trades 10000] [--users 200000]
+
+«Пересчёт» — FIFO-проход по всем сделкам пользователя (как пришлось бы
+делать по журналу сделок), «инкрементально» — Portfolio.pnl_units по лотам,
+которые обновляются при каждой сделке. Затем замеряется BulkPnL.report
+для --users синтетических пользователей.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from valutatrade_hub.core.models import CostBasis, Portfolio
+from valutatrade_hub.core.rate_matrix import RateMatrix
+from valutatrade_hub.core.valuation import BulkPnL
+
+
+RATES = {"BTC_USD": 59337.21, "ETH_USD": 2726.45, "EUR_USD": 1.0786}
+
+
+class FixedRates:
+    def __init__(self) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        self.matrix = RateMatrix.from_pairs(
+            {pair: {"rate": rate, "updated_at": now} for pair, rate in RATES.items()}
+        )
+
+    def get_matrix(self) -> RateMatrix:
+        return self.matrix
+
+
+def make_trades(count: int) -> list[tuple[str, str, int, int]]:
+    """(action, currency, units, base_units) — покупки чаще продаж, баланс не уходит в минус."""
+    rng = random.Random(42)
+    held = {"BTC": 0, "ETH": 0}
+    trades = []
+    for _ in range(count):
+        code = rng.choice(list(held))
+        units = rng.randint(1, 10**7)
+        price = rng.randint(1000, 5000)
+        if held[code] >= units and rng.random() < 0.4:
+            held[code] -= units
+            trades.append(("SELL", code, units, units * price // 10**6))
+        else:
+            held[code] += units
+            trades.append(("BUY", code, units, units * price // 10**6))
+    return trades
+
+
+def replay(trades) -> dict[str, tuple[int, int]]:
+    bases: dict[str, CostBasis] = {}
+    for action, code, units, base_units in trades:
+        basis = bases.setdefault(code, CostBasis())
+        if action == "BUY":
+            basis.add(units, base_units)
+        else:
+            basis.remove(units, base_units)
+    return {code: (b.cost, b.realized) for code, b in bases.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rates = FixedRates().get_matrix()
+    trades = make_trades(args.trades)
+
+    portfolio = Portfolio(1)
+    portfolio.cost_base = "USD"
+    for action, code, units, base_units in trades:
+        wallet = portfolio.get_wallet(code) or portfolio.add_currency(code)
+        if action == "BUY":
+            wallet.deposit(units / 10**8)
+            wallet.basis.add(units, base_units)
+        else:
+            wallet.withdraw(units / 10**8)
+            wallet.basis.remove(units, base_units)
+
+    started = time.perf_counter()
+    replayed = replay(trades)
+    replay_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        rows = portfolio.pnl_units(rates)
+    incremental_time = (time.perf_counter() - started) / 1000
+
+    assert {code: (r["cost"], r["realized"]) for code, r in rows.items()} == replayed
+
+    print(f"сделок у пользователя: {args.trades}")
+    print(f"пересчёт по сделкам: {replay_time * 1e6:10.1f} мкс")
+    print(f"инкрементально:      {incremental_time * 1e6:10.1f} мкс ({replay_time / incremental_time:.0f}x)")
+
+    rng = np.random.default_rng(42)
+    codes = ["BTC", "ETH", "EUR"]
+    units = rng.integers(0, 10**9, size=(args.users, len(codes)), dtype=np.int64)
+    pnl = BulkPnL(FixedRates())
+    pnl.set_units(np.arange(1, args.users + 1, dtype=np.int64), codes, units)
+    pnl.cost_bases = ["USD"] * args.users
+    pnl.cost = rng.integers(0, 10**7, size=args.users).tolist()
+    pnl.realized = rng.integers(-10**6, 10**6, size=args.users).tolist()
+
+    started = time.perf_counter()
+    report = pnl.report("USD")
+    bulk_time = time.perf_counter() - started
+    print(f"BulkPnL.report: {args.users} пользователей за {bulk_time * 1000:.1f} мс "
+          f"(нереализованный итог {int(report['unrealized'].sum()) / report['scale']:.2f} USD)")
+
+
+if __name__ == "__main__":
+    main()
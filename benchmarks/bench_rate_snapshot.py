@@ -0,0 +1,102 @@
+"""Чтение курсов: разбор rates.json против mmap-снимка rates.bin.
+
+    poetry run python benchmarks/bench_rate_snapshot.py [--pairs 200] [--seconds 3]
+
+Сначала сравнивается стоимость чтения всего снимка и проверки «изменился ли
+снимок» (stat + кеш против чтения поколения из mmap). Затем отдельный
+процесс непрерывно переписывает rates.bin, а читатель проверяет, что ни
+одно прочитанное состояние не смешивает записи разных поколений.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from valutatrade_hub.core.currencies import get_registry
+from valutatrade_hub.infra.rate_snapshot import RateEntry, RateSnapshot
+
+
+def make_entries(pairs: int, value: float) -> list[RateEntry]:
+    codes = [c for c in get_registry().codes if c != "USD"][:pairs]
+    now = time.time()
+    return [RateEntry(f"{code}_USD", value, now, "Bench") for code in codes]
+
+
+def per_call(fn, seconds: float) -> float:
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        fn()
+        count += 1
+    return (time.perf_counter() - started) / count
+
+
+def writer(path: str, pairs: int, stop) -> None:
+    snapshot = RateSnapshot(Path(path))
+    value = 1.0
+    while not stop.is_set():
+        value += 1
+        snapshot.write(make_entries(pairs, value), time.time())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "rates.json"
+        bin_path = Path(tmp) / "rates.bin"
+
+        entries = make_entries(args.pairs, 1.0)
+        pairs = {
+            e.pair: {"rate": e.rate, "updated_at": "2026-10-18T12:00:00+00:00", "source": e.source}
+            for e in entries
+        }
+        json_path.write_text(json.dumps({"pairs": pairs, "last_refresh": None}, indent=2))
+        RateSnapshot(bin_path).write(entries, time.time())
+
+        def read_json():
+            with json_path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+
+        reader = RateSnapshot(bin_path)
+        budget = args.seconds / 4
+        json_read = per_call(read_json, budget)
+        bin_read = per_call(reader.read, budget)
+        json_check = per_call(lambda: os.stat(json_path), budget)
+        bin_check = per_call(reader.generation, budget)
+
+        print(f"пар в снимке: {len(entries)}")
+        print(f"весь снимок:   rates.json {json_read * 1e6:8.1f} мкс, rates.bin {bin_read * 1e6:8.1f} мкс")
+        print(f"проверка смены: stat       {json_check * 1e6:8.2f} мкс, поколение  {bin_check * 1e6:8.2f} мкс")
+
+        stop = mp.Event()
+        proc = mp.Process(target=writer, args=(str(bin_path), args.pairs, stop))
+        proc.start()
+
+        reads = torn = 0
+        generations = set()
+        deadline = time.perf_counter() + args.seconds / 2
+        while time.perf_counter() < deadline:
+            data = reader.read()
+            reads += 1
+            generations.add(data.generation)
+            if len({rate for _, _, _, rate, _ in data.records}) > 1:
+                torn += 1
+
+        stop.set()
+        proc.join()
+        reader.close()
+
+    print(f"чтений при активной записи: {reads}, поколений: {len(generations)}, рваных чтений: {torn}")
+    if torn:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Последние сделки пользователя: индекс смещений против просмотра всего журнала.
+
+    poetry run python benchmarks/bench_trade_history.py [--trades 500000] [--users 10000] [--limit 20]
+
+Синтетический журнал trades.jsonl с heads.idx строится в формате
+TradeLedger напрямую (без fsync на каждую запись), затем сравнивается
+TradeLedger.tail и фильтрация всех строк журнала по user_id.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from valutatrade_hub.infra.ledger import HEAD, TradeLedger
+
+
+def build(directory: Path, trades: int, users: int) -> None:
+    rng = random.Random(42)
+    heads = [0] * (users + 1)
+    offset = 0
+    with (directory / "trades.jsonl").open("wb") as f:
+        for i in range(trades):
+            user_id = rng.randint(1, users)
+            line = json.dumps({
+                "user_id": user_id,
+                "action": "BUY",
+                "currency": "BTC",
+                "amount": "0.01000000",
+                "rate": 60000.0 + i,
+                "base": "USD",
+                "base_value": "600.00",
+                "timestamp": "2026-10-18T12:00:00+00:00",
+                "prev": heads[user_id] - 1 if heads[user_id] else None,
+            }, separators=(",", ":")).encode() + b"\n"
+            f.write(line)
+            heads[user_id] = offset + 1
+            offset += len(line)
+    (directory / "heads.idx").write_bytes(b"".join(HEAD.pack(h) for h in heads))
+
+
+def scan(path: Path, user_id: int, limit: int) -> list[dict]:
+    trades = []
+    with path.open("rb") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["user_id"] == user_id:
+                record.pop("prev")
+                trades.append(record)
+    return trades[::-1][:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        build(directory, args.trades, args.users)
+        ledger = TradeLedger(directory)
+        user_id = args.users // 2
+
+        started = time.perf_counter()
+        for _ in range(100):
+            indexed = ledger.tail(user_id, args.limit)
+        tail_time = (time.perf_counter() - started) / 100
+
+        started = time.perf_counter()
+        scanned = scan(ledger.path, user_id, args.limit)
+        scan_time = time.perf_counter() - started
+
+        assert indexed == scanned
+
+    print(f"сделок в журнале: {args.trades}, пользователей: {args.users}, limit: {args.limit}")
+    print(f"индекс смещений:   {tail_time * 1000:9.3f} мс")
+    print(f"просмотр журнала:  {scan_time * 1000:9.3f} мс ({scan_time / tail_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Нагрузочный тест HTTP API: запросов в секунду и задержки (p50/p99) по эндпоинтам.
+
+    poetry run project serve &
+    poetry run python benchmarks/load_test_api.py [--host 127.0.0.1] [--port 8080]
+        [--connections 32] [--seconds 10] [--mix rate=8,portfolio=1,buy=1]
+
+Каждое соединение — keep-alive клиент, который по кругу отправляет запросы
+в пропорциях --mix от имени своего пользователя (loadtest_<N>).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from itertools import accumulate
+
+
+PASSWORD = "loadtest-password"
+
+
+class Client:
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.token: str | None = None
+
+    async def connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method: str, path: str, payload: dict | None = None) -> tuple[int, dict]:
+        body = json.dumps(payload).encode() if payload is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write(head.encode() + b"\r\n" + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length)
+        return status, json.loads(data) if data else {}
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+OPERATIONS = {
+    "rate": ("GET", "/rate?from=BTC&to=USD", None),
+    "portfolio": ("GET", "/portfolio?base=USD", None),
+    "buy": ("POST", "/buy", {"currency": "EUR", "amount": 1}),
+    "sell": ("POST", "/sell", {"currency": "EUR", "amount": 1}),
+}
+
+
+async def worker(n: int, args, mix: dict[str, int], deadline: float, results: dict) -> None:
+    client = Client(args.host, args.port)
+    await client.connect()
+
+    username = f"loadtest_{n}"
+    await client.request("POST", "/register", {"username": username, "password": PASSWORD})
+    status, data = await client.request("POST", "/login", {"username": username, "password": PASSWORD})
+    if status != 200:
+        raise RuntimeError(f"login {username}: {status} {data}")
+    client.token = data["token"]
+
+    names = list(mix)
+    weights = list(accumulate(mix.values()))
+    rng = random.Random(n)
+
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, cum_weights=weights)[0]
+        method, path, payload = OPERATIONS[name]
+        started = time.perf_counter()
+        status, _ = await client.request(method, path, payload)
+        elapsed = time.perf_counter() - started
+
+        latencies, errors = results.setdefault(name, ([], {}))
+        latencies.append(elapsed)
+        if status >= 400:
+            errors[status] = errors.get(status, 0) + 1
+
+    await client.close()
+
+
+async def run(args) -> None:
+    mix = parse_mix(args.mix)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Неизвестные операции в --mix: {', '.join(sorted(unknown))}")
+
+    results: dict[str, tuple[list[float], dict[int, int]]] = {}
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    await asyncio.gather(*(
+        worker(n, args, mix, deadline, results) for n in range(args.connections)
+    ))
+    elapsed = time.perf_counter() - started
+
+    print(f"{'endpoint':<10} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}  errors")
+    all_latencies = []
+    for name, (latencies, errors) in sorted(results.items()):
+        all_latencies += latencies
+        print(
+            f"{name:<10} {len(latencies):>9} {len(latencies) / elapsed:>9.0f} "
+            f"{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}  "
+            f"{errors or '-'}"
+        )
+    print(
+        f"{'total':<10} {len(all_latencies):>9} {len(all_latencies) / elapsed:>9.0f} "
+        f"{percentile(all_latencies, 0.5) * 1000:>8.2f} {percentile(all_latencies, 0.99) * 1000:>8.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--mix", default="rate=8,portfolio=1,buy=1")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Нагрузочная проверка: несколько процессов одновременно покупают валюту.
+
+    poetry run python benchmarks/stress_concurrent_trades.py [--backend json|sqlite]
+        [--processes 8] [--trades 200] [--users 1] [--shards 1] [--no-journal]
+
+Каждый процесс выполняет --trades покупок по 1 единице для пользователя
+номер (процесс % users). В конце баланс каждого пользователя должен быть
+ровно числом его покупок: ни одно обновление не должно потеряться.
+С --users > 1 и --shards > 1 видно, как шардирование портфелей снижает
+конкуренцию за запись. --no-journal отключает журнал сделок: каждая
+сделка переписывает снимок портфелей, и конфликты версий случаются чаще.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+USERNAME = "stress_{}"
+PASSWORD = "stress-password"
+CURRENCY = "EUR"
+
+
+def _enter(workdir: str) -> None:
+    # SettingsLoader читает pyproject.toml из текущей директории
+    os.chdir(workdir)
+
+
+def _setup(workdir: str, users: int) -> None:
+    _enter(workdir)
+    from valutatrade_hub.core.usecases import AuthService
+
+    auth = AuthService()
+    for i in range(users):
+        auth.register(USERNAME.format(i), PASSWORD)
+
+
+def _worker(workdir: str, username: str, trades: int, start) -> int:
+    _enter(workdir)
+    from valutatrade_hub.core.usecases import AuthService, PortfolioService
+    from valutatrade_hub.infra.database import DatabaseManager
+
+    auth = AuthService()
+    auth.login(username, PASSWORD)
+    portfolio = PortfolioService(auth)
+
+    start.wait()
+    for _ in range(trades):
+        portfolio.buy(CURRENCY, 1)
+
+    DatabaseManager().close()
+    return trades
+
+
+def _balances(workdir: str, users: int) -> list[int]:
+    _enter(workdir)
+    from valutatrade_hub.core.money import from_units, wallet_units
+    from valutatrade_hub.infra.database import DatabaseManager
+
+    db = DatabaseManager()
+    balances = []
+    for i in range(users):
+        user = db.get_user_by_username(USERNAME.format(i))
+        p = db.get_portfolio(user["user_id"])
+        units = wallet_units(p["wallets"].get(CURRENCY, {}), CURRENCY)
+        balances.append(int(from_units(units, CURRENCY)))
+    return balances
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--trades", type=int, default=200)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--no-journal", action="store_true")
+    args = parser.parse_args()
+
+    repo_root = str(Path(__file__).resolve().parent.parent)
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+
+    ctx = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        Path(workdir, "data").mkdir()
+        Path(workdir, "data", "users.json").write_text("[]", encoding="utf-8")
+        Path(workdir, "pyproject.toml").write_text(
+            "[tool.valutatrade]\n"
+            'data_dir = "data"\n'
+            'log_path = "actions.log"\n'
+            f'storage_backend = "{args.backend}"\n'
+            f"portfolio_shards = {args.shards}\n"
+            f"journal_enabled = {'false' if args.no_journal else 'true'}\n"
+            'password_hasher = "pbkdf2_sha256"\n'
+            "password_hasher_params = { iterations = 1000 }\n",
+            encoding="utf-8",
+        )
+
+        with ctx.Pool(1) as pool:
+            pool.apply(_setup, (workdir, args.users))
+
+        start = ctx.Manager().Event()
+        with ctx.Pool(args.processes) as pool:
+            results = [
+                pool.apply_async(
+                    _worker, (workdir, USERNAME.format(i % args.users), args.trades, start)
+                )
+                for i in range(args.processes)
+            ]
+            time.sleep(0.5)
+            started = time.perf_counter()
+            start.set()
+            done = sum(r.get() for r in results)
+            elapsed = time.perf_counter() - started
+
+        with ctx.Pool(1) as pool:
+            balances = pool.apply(_balances, (workdir, args.users))
+
+    expected = [
+        args.trades * len(range(i, args.processes, args.users)) for i in range(args.users)
+    ]
+    print(
+        f"backend={args.backend} shards={args.shards} users={args.users} "
+        f"journal={not args.no_journal} processes={args.processes} trades={done}"
+    )
+    print(f"{done / elapsed:,.0f} сделок/с, итоговые балансы {balances} (ожидалось {expected})")
+    if balances != expected:
+        print("ОШИБКА: часть обновлений потеряна")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from valutatrade_hub.core.exceptions import (
+    ApiRequestError,
+    ConcurrentUpdateError,
+    CurrencyNotFoundError,
+    InsufficientFundsError,
+)
+from valutatrade_hub.core.currencies import get_currency
+from valutatrade_hub.core.models import User
+from valutatrade_hub.core.money import from_units
+from valutatrade_hub.core.usecases import AuthService, PortfolioService, RateService
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.logging_config import setup_logging
+
+
+MAX_BODY_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    # денежные суммы отдаются строкой, как в журнале сделок: float потерял бы точность
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        self.status = status
+        self.message = message
+        super().__init__(message)
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict[str, str], body: bytes) -> None:
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            # дробные суммы приходят как Decimal — без потерь при переводе в единицы хранения
+            data = json.loads(self.body, parse_float=Decimal)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Тело запроса должно быть JSON-объектом")
+        if not isinstance(data, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Тело запроса должно быть JSON-объектом")
+        return data
+
+    def token(self) -> str | None:
+        scheme, _, token = self.headers.get("authorization", "").partition(" ")
+        return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+class ApiServer:
+    """HTTP/JSON API поверх AuthService, PortfolioService и RateService.
+
+    Один процесс обслуживает всех клиентов: сессии, индексы хранилища и
+    матрица курсов живут в памяти между запросами. Пользователь определяется
+    по токену из POST /login (заголовок Authorization: Bearer <token>).
+    Операции с хранилищем выполняются по очереди в отдельном потоке,
+    поэтому цикл событий не блокируется на диске и KDF, а чтение курсов
+    отвечает прямо из прогретой матрицы.
+    """
+
+    def __init__(self) -> None:
+        self.auth = AuthService()
+        self.portfolio = PortfolioService(self.auth)
+        self.rates = RateService()
+        self.db = DatabaseManager()
+        self._storage = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+
+        self.routes = {
+            ("POST", "/register"): self.handle_register,
+            ("POST", "/login"): self.handle_login,
+            ("POST", "/logout"): self.handle_logout,
+            ("GET", "/portfolio"): self.handle_portfolio,
+            ("POST", "/buy"): self.handle_buy,
+            ("POST", "/sell"): self.handle_sell,
+            ("GET", "/rate"): self.handle_rate,
+        }
+
+    async def _in_storage(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._storage, func, *args)
+
+    def _user(self, request: Request) -> User:
+        token = request.token()
+        if token is None:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "Нужен заголовок Authorization: Bearer <token>")
+        try:
+            return self.auth.authenticate(token)
+        except ValueError as e:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, str(e))
+
+    # handlers
+
+    async def handle_register(self, request: Request) -> tuple[HTTPStatus, dict]:
+        body = request.json()
+        user = await self._in_storage(
+            self.auth.create_user, body.get("username"), body.get("password")
+        )
+        return HTTPStatus.CREATED, {"user_id": user.user_id, "username": user.username}
+
+    async def handle_login(self, request: Request) -> tuple[HTTPStatus, dict]:
+        body = request.json()
+        user = await self._in_storage(
+            self.auth.check_credentials, body.get("username"), body.get("password")
+        )
+        token = self.auth.sessions.create(user)
+        return HTTPStatus.OK, {"token": token, "user_id": user.user_id}
+
+    async def handle_logout(self, request: Request) -> tuple[HTTPStatus, dict]:
+        self._user(request)
+        self.auth.sessions.revoke(request.token())
+        return HTTPStatus.OK, {}
+
+    async def handle_portfolio(self, request: Request) -> tuple[HTTPStatus, dict]:
+        user = self._user(request)
+        base = request.query.get("base", self.auth.settings.get("DEFAULT_BASE_CURRENCY", "USD"))
+        as_of = None
+        if "as_of" in request.query:
+            try:
+                as_of = datetime.fromisoformat(request.query["as_of"])
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "as_of должен быть датой ISO 8601")
+        result = await self._in_storage(self.portfolio.show_portfolio, base, user, as_of)
+        return HTTPStatus.OK, result
+
+    def _trade(self, action, user: User, currency, amount) -> dict:
+        if isinstance(amount, bool) or not isinstance(amount, (int, Decimal, str)):
+            raise ValueError("'amount' должен быть положительным числом")
+        action(currency, amount, user)
+
+        code = get_currency(currency).code
+        wallet = self.db.load_portfolio(user.user_id).get_wallet(code)
+        return {
+            "currency": code,
+            "amount": Decimal(amount),
+            "balance": wallet.balance if wallet is not None else from_units(0, code),
+        }
+
+    async def handle_buy(self, request: Request) -> tuple[HTTPStatus, dict]:
+        user = self._user(request)
+        body = request.json()
+        result = await self._in_storage(
+            self._trade, self.portfolio.buy, user, body.get("currency"), body.get("amount")
+        )
+        return HTTPStatus.OK, result
+
+    async def handle_sell(self, request: Request) -> tuple[HTTPStatus, dict]:
+        user = self._user(request)
+        body = request.json()
+        result = await self._in_storage(
+            self._trade, self.portfolio.sell, user, body.get("currency"), body.get("amount")
+        )
+        return HTTPStatus.OK, result
+
+    async def handle_rate(self, request: Request) -> tuple[HTTPStatus, dict]:
+        src = request.query.get("from")
+        dst = request.query.get("to")
+        if not src or not dst:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Укажите параметры from и to")
+        result = self.rates.get_rate(src, dst)
+        return HTTPStatus.OK, {"from": src.upper(), "to": dst.upper(), **result}
+
+    # HTTP
+
+    async def dispatch(self, request: Request) -> tuple[HTTPStatus, dict]:
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Метод не поддерживается"}
+            return HTTPStatus.NOT_FOUND, {"error": "Неизвестный адрес"}
+
+        try:
+            return await handler(request)
+        except HttpError as e:
+            return e.status, {"error": e.message}
+        except CurrencyNotFoundError as e:
+            return HTTPStatus.NOT_FOUND, {"error": str(e)}
+        except (InsufficientFundsError, ConcurrentUpdateError) as e:
+            return HTTPStatus.CONFLICT, {"error": str(e)}
+        except ApiRequestError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception:
+            logger.exception("Ошибка при обработке %s %s", request.method, request.path)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Неизвестная ошибка."}
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Request | None:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Некорректная строка запроса")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        headers["connection"] = (
+            "keep-alive" if connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+            else "close"
+        )
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Некорректный Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Слишком большое тело запроса")
+        body = await reader.readexactly(length) if length > 0 else b""
+
+        return Request(method.upper(), target, headers, body)
+
+    @staticmethod
+    def _write_response(
+        writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict, keep_alive: bool
+    ) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    self._write_response(writer, e.status, {"error": e.message}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                status, payload = await self.dispatch(request)
+                keep_alive = request.headers["connection"] == "keep-alive"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        try:
+            self.rates.get_matrix()
+        except FileNotFoundError:
+            logger.warning("rates.json не найден — курсы будут загружены при первом запросе")
+
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"ValutaTrade Hub API слушает http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        self._storage.submit(self.db.close).result()
+        self._storage.shutdown()
+
+
+def run_server(host: str | None = None, port: int | None = None) -> None:
+    settings = SettingsLoader()
+    setup_logging()
+
+    server = ApiServer()
+    try:
+        asyncio.run(server.serve(
+            host or settings.get("API_HOST", "127.0.0.1"),
+            port or int(settings.get("API_PORT", 8080)),
+        ))
+    except KeyboardInterrupt:
+        print("Сервер остановлен")
+    finally:
+        server.close()
@@ -1,4 +1,8 @@
+import csv
 import shlex
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 
 from prettytable import PrettyTable
 from valutatrade_hub.core.usecases import AuthService, PortfolioService, RateService
@@ -6,9 +10,16 @@ from valutatrade_hub.core.exceptions import (
     CurrencyNotFoundError,
     InsufficientFundsError,
     ApiRequestError,
+    LockBusyError,
+    ConcurrentUpdateError,
 )
 from valutatrade_hub.parser_service.updater import RatesUpdater
+from valutatrade_hub.parser_service.config import ParserConfig
+from valutatrade_hub.parser_service.history import HistoryStore, parse_interval
 from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.core.money import from_units
+from valutatrade_hub.core.valuation import BulkPnL
 
 
 def parse_args(parts: list[str]) -> dict:
@@ -30,12 +41,29 @@ def handle_error(exc: Exception) -> None:
     elif isinstance(exc, ApiRequestError):
         print(str(exc))
         print("Повторите попытку позже.")
+    elif isinstance(exc, LockBusyError):
+        print("Курсы уже обновляются другим процессом. Повторите попытку позже.")
+    elif isinstance(exc, ConcurrentUpdateError):
+        print(str(exc))
+        print("Повторите операцию.")
+    elif isinstance(exc, OSError):
+        print(f"Не удалось открыть файл {exc.filename}: {exc.strerror}" if exc.filename else str(exc))
     elif isinstance(exc, ValueError):
         print(str(exc))
     else:   
         print("Неизвестная ошибка.")
 
 
+def parse_datetime(value: str) -> datetime:
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Некорректная дата '{value}', ожидается ISO 8601 (2026-09-30T23:59Z)")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
 def print_help() -> None:
     print(
         """
@@ -43,12 +71,15 @@ def print_help() -> None:
 ====================================
 - register --username <name> --password <password> - регистрация
 - login --username <name> --password <password> - вход
-- show-portfolio [--base <CODE>] - показать портфель
+- show-portfolio [--base <CODE>] [--as-of <ISO>] - показать портфель (по курсам на момент времени)
 - buy --currency <CODE> --amount <amount> - купить валюту
 - sell --currency <CODE> --amount <amount> - продать валюту
+- trade-history [--limit <N>] - последние сделки пользователя
+- pnl - себестоимость, нереализованный и реализованный результат
 - get-rate --from <CODE> --to <CODE> - получить курс
 - update-rates [--source <coingecko|exchangerate>] - обновить актуальные курсы
 - show-rates [--currency <CODE>] [--top <N>] [--base <CODE>] - показать курсы
+- rate-history --pair <PAIR> [--from <ISO>] [--to <ISO>] [--interval <1h>] - OHLC по истории курсов
 - exit - завершить программу
 - help - показать это сообщение
 ====================================
@@ -57,6 +88,368 @@ def print_help() -> None:
     )
 
 
+def execute_command(
+    raw: str, auth: AuthService, portfolio: PortfolioService, rates: RateService
+) -> bool:
+    """Выполняет одну команду. Возвращает False, если нужно завершить работу."""
+    parts = shlex.split(raw)
+    command = parts[0]
+    args = parse_args(parts[1:])
+
+    match command:
+        case "exit":
+            print("\nПрограмма завершается...")
+            db = DatabaseManager()
+            # внутри пакета хранилище закрывает run_batch после записи транзакции
+            if not db.in_transaction:
+                db.close()
+            return False
+
+        case "register":
+            username = args.get("username")
+            password = args.get("password")
+
+            if not username or not password:
+                print("Использование: register --username <name> --password <password>")
+                return True
+
+            auth.register(username, password)
+
+
+        case "login":
+            username = args.get("username")
+            password = args.get("password")
+
+            if not username or not password:
+                print("Использование: login --username <name> --password <password>")
+                return True
+
+            auth.login(username, password)
+
+
+        case "show-portfolio":
+            base = args.get("base", "USD")
+            as_of = parse_datetime(args["as-of"]) if args.get("as-of") else None
+
+            data = portfolio.show_portfolio(base, as_of=as_of)
+
+            table = PrettyTable()
+            table.field_names = ["Currency", "Balance", f"Value ({base})"]
+
+            for item in data["items"]:
+                table.add_row([
+                    item["currency"],
+                    f"{item['balance']:.4f}",
+                    f"{item['value']:.2f}",
+                ])
+
+            at = f", курсы на {as_of.isoformat()}" if as_of else ""
+            print(f"\nПортфель пользователя '{data['user']}' (база: {base}{at})")
+            if data["items"]:
+                print(table)
+                print("-" * 40)
+                print(f"ИТОГО: {data['total']:.2f} {base}")
+            else:
+                print("Портфель пуст")
+
+
+        case "buy":
+            currency = args.get("currency")
+            amount = args.get("amount")
+
+            if not currency or not amount:
+                print("Использование: buy --currency <CODE> --amount <NUMBER>")
+                return True
+
+            portfolio.buy(currency, amount)
+            print(f"Покупка выполнена: {amount} {currency.upper()}")
+
+        case "sell":
+            currency = args.get("currency")
+            amount = args.get("amount")
+
+            if not currency or not amount:
+                print("Использование: sell --currency <CODE> --amount <NUMBER>")
+                return True
+
+            portfolio.sell(currency, amount)
+            print(f"Продажа выполнена: {amount} {currency.upper()}")
+
+
+        case "trade-history":
+            try:
+                limit = int(args.get("limit") or 10)
+            except ValueError:
+                print("'limit' должен быть числом")
+                return True
+
+            trades = portfolio.trade_history(limit)
+            if not trades:
+                print("Сделок пока нет.")
+                return True
+
+            table = PrettyTable()
+            table.field_names = ["Time", "Action", "Currency", "Amount", "Rate", "Value"]
+            for trade in trades:
+                table.add_row([
+                    trade["timestamp"],
+                    trade["action"],
+                    trade["currency"],
+                    trade["amount"],
+                    f"{trade['rate']:.6g}" if trade["rate"] is not None else "-",
+                    f"{trade['base_value']} {trade['base']}" if trade["base_value"] is not None else "-",
+                ])
+            print(table)
+
+        case "pnl":
+            data = portfolio.pnl()
+            if not data["items"]:
+                print("Себестоимость ещё не учитывалась: нет сделок с известным курсом.")
+                return True
+
+            base = data["base"]
+
+            def fmt(value) -> str:
+                return f"{value:.2f}" if value is not None else "-"
+
+            table = PrettyTable()
+            table.field_names = [
+                "Currency", "Balance", "Untracked", f"Cost ({base})", f"Value ({base})",
+                "Unrealized", "Realized",
+            ]
+            for item in data["items"]:
+                table.add_row([
+                    item["currency"],
+                    f"{item['balance']:f}",
+                    f"{item['untracked']:f}",
+                    fmt(item["cost"]),
+                    fmt(item["value"]),
+                    fmt(item["unrealized"]),
+                    fmt(item["realized"]),
+                ])
+
+            print(f"\nP&L пользователя '{data['user']}' (себестоимость в {base})")
+            print(table)
+            print(f"Нереализованный: {fmt(data['unrealized'])} {base}")
+            print(f"Реализованный:   {fmt(data['realized'])} {base}")
+
+        case "get-rate":
+            src = args.get("from")
+            dst = args.get("to")
+
+            if not src or not dst:
+                print("Использование: get-rate --from <CODE> --to <CODE>")
+                return True
+
+            data = rates.get_rate(src, dst)
+
+            print(
+                f"Курс {src.upper()}→{dst.upper()}: "
+                f"{data['rate']} (обновлено: {data['updated_at']})"
+            )
+
+        case "update-rates":
+            source = args.get("source")
+
+            if source is not None and source not in ("coingecko", "exchangerate"):
+                print("Источник должен быть 'coingecko' или 'exchangerate'")
+                return True
+
+            # RatesStorage при создании может записать rates.json и rates.bin —
+            # только под блокировкой единственного писателя
+            with RatesUpdater.lock():
+                result = RatesUpdater.build_rates_updater(source).run_update()
+
+            print(
+                f"Update successful. Total rates updated: {result['updated']} "
+                f"(changed: {result['changed']}). "
+                f"Last refresh: {result['last_refresh']}"
+            )
+
+        case "show-rates":
+            data = RateService().get_snapshot()
+            pairs = data.get("pairs", {})
+            if not pairs:
+                print("Локальный кеш курсов пуст. Выполните 'update-rates'.")
+                return True
+
+            base = args.get("base", None)
+            currency = args.get("currency", None)
+            top = args.get("top", None)
+
+            rows = []
+            for pair, entry in pairs.items():
+                frm, to = pair.split("_")
+
+                if currency and frm != currency and to != currency:
+                    continue
+
+                if base and to != base:
+                    continue
+
+                rows.append((pair, entry["rate"], entry["updated_at"], entry["source"]))
+
+            if not rows:
+                print("Курсы по заданным фильтрам не найдены.")
+                return True
+
+            if top:
+                try:
+                    n = int(top)
+                    rows.sort(key=lambda r: r[1], reverse=True)
+                    rows = rows[:n]
+                except ValueError:
+                    print("'top' должен быть числом")
+                    return True
+
+            print(f"Rates from cache (updated at {data.get('last_refresh')}):")
+            for pair, rate, updated_at, source in rows:
+                print(f"- {pair}: {rate} (updated: {updated_at}, source: {source})")
+
+
+        case "rate-history":
+            pair = args.get("pair")
+
+            if not pair:
+                print(
+                    "Использование: rate-history --pair <PAIR> "
+                    "[--from <ISO>] [--to <ISO>] [--interval <1h>]"
+                )
+                return True
+
+            end = parse_datetime(args["to"]) if args.get("to") else datetime.now(timezone.utc)
+            start = (
+                parse_datetime(args["from"]) if args.get("from")
+                else end - timedelta(days=1)
+            )
+            interval = parse_interval(args.get("interval") or "1h")
+
+            history = HistoryStore(ParserConfig().HISTORY_DIR_PATH)
+            bars = history.ohlc(
+                pair.upper(), start.timestamp(), end.timestamp(), interval
+            )
+
+            if not bars:
+                print(f"История курса {pair.upper()} за указанный период не найдена.")
+                return True
+
+            table = PrettyTable()
+            table.field_names = ["Start", "Open", "High", "Low", "Close", "Count"]
+            for bar in bars:
+                table.add_row([
+                    bar["start"],
+                    f"{bar['open']:.6g}",
+                    f"{bar['high']:.6g}",
+                    f"{bar['low']:.6g}",
+                    f"{bar['close']:.6g}",
+                    bar["count"],
+                ])
+            print(table)
+
+        case "help":
+            print_help()
+
+        case _:
+            print(f"Неизвестная команда '{command}' введите 'help'.")
+
+    return True
+
+
+def run_batch(source: str) -> None:
+    """Выполняет команды из файла (или stdin при source == "-") в одной транзакции хранилища."""
+    auth = AuthService()
+    portfolio = PortfolioService(auth)
+    rates = RateService()
+    db = DatabaseManager()
+
+    try:
+        stream = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+    except OSError as e:
+        handle_error(e)
+        db.close()
+        return
+
+    timings: dict[str, list[float]] = {}
+    errors = 0
+
+    started = time.perf_counter()
+    try:
+        with db.transaction():
+            for line in stream:
+                raw = line.strip()
+                if not raw or raw.startswith("#"):
+                    continue
+
+                command = raw.split(maxsplit=1)[0]
+                t0 = time.perf_counter()
+                try:
+                    proceed = execute_command(raw, auth, portfolio, rates)
+                except Exception as e:
+                    errors += 1
+                    handle_error(e)
+                    proceed = True
+                timings.setdefault(command, []).append(time.perf_counter() - t0)
+
+                if not proceed:
+                    break
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    total = time.perf_counter() - started
+
+    table = PrettyTable()
+    table.field_names = ["Command", "Count", "Total, ms", "Avg, ms", "Max, ms"]
+    for command, values in timings.items():
+        table.add_row([
+            command,
+            len(values),
+            f"{sum(values) * 1000:.2f}",
+            f"{sum(values) / len(values) * 1000:.3f}",
+            f"{max(values) * 1000:.3f}",
+        ])
+
+    count = sum(len(v) for v in timings.values())
+    print(f"\nВыполнено команд: {count}, с ошибкой: {errors}, всего {total:.3f} с")
+    print(table)
+    db.close()
+
+
+def run_pnl_report(base: str | None = None, output: str | None = None) -> None:
+    """P&L всех пользователей в CSV (в stdout или файл output) для отчётов на конец дня."""
+    try:
+        base = base or SettingsLoader().get("DEFAULT_BASE_CURRENCY", "USD")
+        started = time.perf_counter()
+        pnl = BulkPnL()
+        pnl.load()
+        report = pnl.report(base)
+
+        code = report["base"]
+        stream = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+        try:
+            writer = csv.writer(stream)
+            writer.writerow(["user_id", f"value_{code}", f"cost_{code}", f"unrealized_{code}", f"realized_{code}"])
+            for row in zip(
+                report["user_ids"].tolist(),
+                report["value"].tolist(),
+                report["cost"].tolist(),
+                report["unrealized"].tolist(),
+                report["realized"].tolist(),
+            ):
+                writer.writerow([row[0], *(f"{from_units(units, code):f}" for units in row[1:])])
+        finally:
+            if output:
+                stream.close()
+
+        print(
+            f"Пользователей: {len(report['user_ids'])}, {time.perf_counter() - started:.3f} с",
+            file=sys.stderr,
+        )
+    except Exception as e:
+        handle_error(e)
+    finally:
+        DatabaseManager().close()
+
+
 def run_cli() -> None:
     auth = AuthService()
     portfolio = PortfolioService(auth)
@@ -71,160 +464,8 @@ def run_cli() -> None:
             if not raw:
                 continue
 
-            parts = shlex.split(raw)
-            command = parts[0]
-            args = parse_args(parts[1:])
-
-            match command:
-                case "exit":
-                    print("\nПрограмма завершается...")
-                    break
-
-                case "register":
-                    username = args.get("username")
-                    password = args.get("password")
-
-                    if not username or not password:
-                        print("Использование: register --username <name> --password <password>")
-                        continue
-
-                    auth.register(username, password)
-
-
-                case "login":
-                    username = args.get("username")
-                    password = args.get("password")
-
-                    if not username or not password:
-                        print("Использование: login --username <name> --password <password>")
-                        continue
-
-                    auth.login(username, password)
-
-
-                case "show-portfolio":
-                    base = args.get("base", "USD")
-
-                    data = portfolio.show_portfolio(base)
-
-                    table = PrettyTable()
-                    table.field_names = ["Currency", "Balance", f"Value ({base})"]
-
-                    for item in data["items"]:
-                        table.add_row([
-                            item["currency"],
-                            f"{item['balance']:.4f}",
-                            f"{item['value']:.2f}",
-                        ])
-
-                    print(f"\nПортфель пользователя '{data['user']}' (база: {base})")
-                    if data["items"]:
-                        print(table)
-                        print("-" * 40)
-                        print(f"ИТОГО: {data['total']:.2f} {base}")
-                    else:
-                        print("Портфель пуст")
-
-
-                case "buy":
-                    currency = args.get("currency")
-                    amount = args.get("amount")
-
-                    if not currency or not amount:
-                        print("Использование: buy --currency <CODE> --amount <FLOAT>")
-                        continue
-
-                    portfolio.buy(currency, float(amount))
-                    print(f"Покупка выполнена: {amount} {currency.upper()}")
-
-                case "sell":
-                    currency = args.get("currency")
-                    amount = args.get("amount")
-
-                    if not currency or not amount:
-                        print("Использование: sell --currency <CODE> --amount <FLOAT>")
-                        continue
-
-                    portfolio.sell(currency, float(amount))
-                    print(f"Продажа выполнена: {amount} {currency.upper()}")
-
-
-                case "get-rate":
-                    src = args.get("from")
-                    dst = args.get("to")
-
-                    if not src or not dst:
-                        print("Использование: get-rate --from <CODE> --to <CODE>")
-                        continue
-
-                    data = rates.get_rate(src, dst)
-
-                    print(
-                        f"Курс {src.upper()}→{dst.upper()}: "
-                        f"{data['rate']} (обновлено: {data['updated_at']})"
-                    )
-
-                case "update-rates":
-                    source = args.get("source")
-
-                    if source is not None and source not in ("coingecko", "exchangerate"):
-                        print("Источник должен быть 'coingecko' или 'exchangerate'")
-                        continue
-
-                    updater = RatesUpdater.build_rates_updater(source)
-                    result = updater.run_update()
-
-                    print(
-                        f"Update successful. Total rates updated: {result['updated']}. "
-                        f"Last refresh: {result['last_refresh']}"
-                    )
-
-                case "show-rates":
-                    data = DatabaseManager().read("rates.json")
-                    pairs = data.get("pairs", {})
-                    if not pairs:
-                        print("Локальный кеш курсов пуст. Выполните 'update-rates'.")
-                        continue
-
-                    base = args.get("base", None)
-                    currency = args.get("currency", None)
-                    top = args.get("top", None)
-
-                    rows = []
-                    for pair, entry in pairs.items():
-                        frm, to = pair.split("_")
-
-                        if currency and frm != currency and to != currency:
-                            continue
-
-                        if base and to != base:
-                            continue
-
-                        rows.append((pair, entry["rate"], entry["updated_at"], entry["source"]))
-
-                    if not rows:
-                        print("Курсы по заданным фильтрам не найдены.")
-                        continue
-
-                    if top:
-                        try:
-                            n = int(top)
-                            rows.sort(key=lambda r: r[1], reverse=True)
-                            rows = rows[:n]
-                        except ValueError:
-                            print("'top' должен быть числом")
-                            continue
-
-                    print(f"Rates from cache (updated at {data.get('last_refresh')}):")
-                    for pair, rate, updated_at, source in rows:
-                        print(f"- {pair}: {rate} (updated: {updated_at}, source: {source})")
-
-
-                case "help":
-                    print_help()
-
-                case _:
-                    print(f"Неизвестная команда '{command}' введите 'help'.")
+            if not execute_command(raw, auth, portfolio, rates):
+                break
 
         except Exception as e:
             handle_error(e)
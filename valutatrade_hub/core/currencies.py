@@ -1,9 +1,17 @@
+import hashlib
+import json
+import sys
 from abc import ABC, abstractmethod
+from pathlib import Path
+
 from valutatrade_hub.core.exceptions import CurrencyNotFoundError
+from valutatrade_hub.infra.settings import SettingsLoader
 
 
 class Currency(ABC):
-    def __init__(self, name: str, code: str) -> None:
+    """decimals — точность суммы: балансы хранятся целым числом единиц 10**-decimals."""
+
+    def __init__(self, name: str, code: str, decimals: int = 2) -> None:
         if not isinstance(name, str) or not name.strip():
             raise ValueError("name должен быть непустой строкой")
         if (
@@ -13,9 +21,13 @@ class Currency(ABC):
             or " " in code
         ):
             raise ValueError("code должен быть в верхнем регистре, 2–5 символов, без пробелов")
+        if isinstance(decimals, bool) or not isinstance(decimals, int) or not 0 <= decimals <= 12:
+            raise ValueError("decimals должен быть целым числом от 0 до 12")
 
         self.name = name
         self.code = code
+        self.decimals = decimals
+        self.id: int | None = None
 
     @abstractmethod
     def get_display_info(self) -> str:
@@ -23,8 +35,8 @@ class Currency(ABC):
 
 
 class FiatCurrency(Currency):
-    def __init__(self, name: str, code: str, issuing_country: str) -> None:
-        super().__init__(name, code)
+    def __init__(self, name: str, code: str, issuing_country: str, decimals: int = 2) -> None:
+        super().__init__(name, code, decimals)
         if not isinstance(issuing_country, str) or not issuing_country.strip():
             raise ValueError("issuing_country должен быть непустой строкой")
         self.issuing_country = issuing_country
@@ -34,8 +46,10 @@ class FiatCurrency(Currency):
 
 
 class CryptoCurrency(Currency):
-    def __init__(self, name: str, code: str, algorithm: str, market_cap: float) -> None:
-        super().__init__(name, code)
+    def __init__(
+        self, name: str, code: str, algorithm: str, market_cap: float, decimals: int = 8
+    ) -> None:
+        super().__init__(name, code, decimals)
         if not isinstance(algorithm, str) or not algorithm.strip():
             raise ValueError("algorithm должен быть непустой строкой")
         if not isinstance(market_cap, (int, float)) or market_cap <= 0:
@@ -53,26 +67,85 @@ class CryptoCurrency(Currency):
 
 
 
-_CURRENCY_REGISTRY = {
-    "USD": FiatCurrency("US Dollar", "USD", "United States"),
-    "EUR": FiatCurrency("Euro", "EUR", "Eurozone"),
-    "RUB": FiatCurrency("Russian Ruble", "RUB", "Russia"),
-    "BTC": CryptoCurrency("Bitcoin", "BTC", "SHA-256", 3_075_031_224_952),
-    "ETH": CryptoCurrency("Ethereum", "ETH", "Ethash", 351_005_166_082),
-    "SOL": CryptoCurrency("Solana", "SOL", "Proof of History", 70_302_875_011),
-} 
+REGISTRY_PATH = Path(__file__).with_name("currencies.json")
+
+
+class CurrencyRegistry:
+    """Реестр валют из JSON-файла (по умолчанию core/currencies.json).
+
+    Каждой валюте присваивается небольшой целый id в порядке файла, поэтому
+    матрицы курсов и массивы балансов могут индексироваться по id, а не по коду.
+    Путь к своему файлу задаётся параметром currencies_file в [tool.valutatrade].
+    """
+
+    def __init__(self, path: Path) -> None:
+        with Path(path).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        currencies: list[Currency] = [
+            FiatCurrency(
+                c["name"], c["code"], c["issuing_country"], c.get("decimals", 2)
+            )
+            for c in data.get("fiat", [])
+        ] + [
+            CryptoCurrency(
+                c["name"], c["code"], c["algorithm"], c["market_cap"], c.get("decimals", 8)
+            )
+            for c in data.get("crypto", [])
+        ]
+
+        self.currencies: list[Currency] = []
+        self.by_code: dict[str, Currency] = {}
+        self.ids: dict[str, int] = {}
+        for currency in currencies:
+            if currency.code in self.by_code:
+                raise ValueError(f"Валюта {currency.code} повторяется в {path}")
+            currency.id = len(self.currencies)
+            self.currencies.append(currency)
+            self.by_code[currency.code] = currency
+            self.ids[sys.intern(currency.code)] = currency.id
+
+        self.codes = [c.code for c in self.currencies]
+        # отпечаток порядка кодов: файлы, хранящие id валют, проверяют по нему реестр
+        self.fingerprint = int.from_bytes(
+            hashlib.blake2b("\n".join(self.codes).encode("ascii"), digest_size=8).digest(),
+            "little",
+        )
+
+    def __len__(self) -> int:
+        return len(self.currencies)
+
+    def get(self, code: str) -> Currency:
+        if not isinstance(code, str):
+            raise CurrencyNotFoundError(str(code))
+
+        # быстрый путь: код уже в каноническом виде
+        currency = self.by_code.get(code)
+        if currency is not None:
+            return currency
+
+        key = code.strip().upper()
+        currency = self.by_code.get(key)
+        if currency is None:
+            raise CurrencyNotFoundError(key)
+        return currency
+
 
+_registry: CurrencyRegistry | None = None
 
 
+def get_registry() -> CurrencyRegistry:
+    global _registry
+    if _registry is None:
+        path = SettingsLoader().get("CURRENCIES_FILE") or REGISTRY_PATH
+        _registry = CurrencyRegistry(path)
+    return _registry
 
 
 def get_currency(code: str) -> Currency:
-    if not isinstance(code, str):
-        raise CurrencyNotFoundError(str(code))
+    return get_registry().get(code)
 
-    key = code.strip().upper()
-    currency = _CURRENCY_REGISTRY.get(key)
-    if currency is None:
-        raise CurrencyNotFoundError(key)
 
-    return currency
+def currency_id(code: str) -> int:
+    """Постоянный номер валюты в реестре (0..len(registry)-1)."""
+    return get_registry().get(code).id
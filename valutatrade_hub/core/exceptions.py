@@ -20,3 +20,17 @@ class ApiRequestError(Exception):
     def __init__(self, reason: str) -> None:
         super().__init__(f"Ошибка при обращении к внешнему API: {reason}")
         self.reason = reason
+
+
+class LockBusyError(Exception):
+    def __init__(self, path: str) -> None:
+        super().__init__(f"Ресурс {path} занят другим процессом")
+        self.path = path
+
+
+class ConcurrentUpdateError(Exception):
+    def __init__(self, user_id: int) -> None:
+        super().__init__(
+            f"Портфель пользователя id={user_id} одновременно изменён другим процессом"
+        )
+        self.user_id = user_id
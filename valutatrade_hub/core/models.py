@@ -1,9 +1,126 @@
 import hashlib
+import hmac
 import secrets
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from collections.abc import Mapping
 from datetime import datetime
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Protocol
+
+from valutatrade_hub.core.exceptions import ApiRequestError, InsufficientFundsError
+from valutatrade_hub.core.money import convert_units, from_units, to_units, wallet_units
+
+
+class PasswordHasher(ABC):
+    """KDF для паролей. Параметры хранятся в самом хеше: <algorithm>$<params>$<hex>."""
+
+    algorithm: str = ""
+
+    @abstractmethod
+    def encode(self, password: str, salt: str) -> str:
+        raise NotImplementedError
+
+    @classmethod
+    @abstractmethod
+    def from_encoded(cls, encoded: str) -> "PasswordHasher":
+        raise NotImplementedError
+
+    def verify(self, password: str, salt: str, encoded: str) -> bool:
+        return hmac.compare_digest(self.encode(password, salt), encoded)
+
+
+@dataclass(frozen=True)
+class Sha256Hasher(PasswordHasher):
+    """Исходная схема: один SHA-256 от password + salt. Только для проверки старых записей."""
+
+    algorithm = "sha256"
+
+    def encode(self, password: str, salt: str) -> str:
+        return hashlib.sha256((password + salt).encode()).hexdigest()
+
+    @classmethod
+    def from_encoded(cls, encoded: str) -> "Sha256Hasher":
+        return cls()
+
+
+@dataclass(frozen=True)
+class Pbkdf2Hasher(PasswordHasher):
+    iterations: int = 600_000
+
+    algorithm = "pbkdf2_sha256"
+
+    def encode(self, password: str, salt: str) -> str:
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), self.iterations)
+        return f"{self.algorithm}${self.iterations}${digest.hex()}"
+
+    @classmethod
+    def from_encoded(cls, encoded: str) -> "Pbkdf2Hasher":
+        _, iterations, _ = encoded.split("$")
+        return cls(iterations=int(iterations))
+
+
+@dataclass(frozen=True)
+class ScryptHasher(PasswordHasher):
+    n: int = 2 ** 14
+    r: int = 8
+    p: int = 1
+
+    algorithm = "scrypt"
+
+    def encode(self, password: str, salt: str) -> str:
+        digest = hashlib.scrypt(
+            password.encode(),
+            salt=salt.encode(),
+            n=self.n,
+            r=self.r,
+            p=self.p,
+            maxmem=128 * self.r * (self.n + self.p + 2) + (1 << 20),
+            dklen=32,
+        )
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${digest.hex()}"
+
+    @classmethod
+    def from_encoded(cls, encoded: str) -> "ScryptHasher":
+        _, n, r, p, _ = encoded.split("$")
+        return cls(n=int(n), r=int(r), p=int(p))
+
+
+_HASHERS: dict[str, type[PasswordHasher]] = {
+    Sha256Hasher.algorithm: Sha256Hasher,
+    Pbkdf2Hasher.algorithm: Pbkdf2Hasher,
+    ScryptHasher.algorithm: ScryptHasher,
+}
+
+
+def make_hasher(algorithm: str, **params) -> PasswordHasher:
+    cls = _HASHERS.get(algorithm)
+    if cls is None:
+        raise ValueError(f"Неизвестный алгоритм хеширования '{algorithm}'")
+    return cls(**params)
+
+
+def hasher_from_encoded(encoded: str) -> PasswordHasher:
+    algorithm = encoded.split("$", 1)[0] if "$" in encoded else Sha256Hasher.algorithm
+    cls = _HASHERS.get(algorithm)
+    if cls is None:
+        raise ValueError(f"Неизвестный алгоритм хеширования '{algorithm}'")
+    return cls.from_encoded(encoded)
+
+
+DEFAULT_HASHER: PasswordHasher = ScryptHasher()
+
+
+class RateProvider(Protocol):
+    def get(self, src: str, dst: str) -> tuple[float, float] | None:
+        """Курс src→dst и время его обновления (unix) либо None."""
+        ...
 
 
 class User:
+    __slots__ = ("_user_id", "_username", "_hashed_password", "_salt", "_registration_date")
+
     def __init__(
         self,
         user_id: int,
@@ -18,6 +135,25 @@ class User:
         self._salt = salt
         self._registration_date = registration_date
 
+    @classmethod
+    def from_record(cls, record: dict) -> "User":
+        return cls(
+            user_id=record["user_id"],
+            username=record["username"],
+            hashed_password=record["hashed_password"],
+            salt=record["salt"],
+            registration_date=datetime.fromisoformat(record["registration_date"]),
+        )
+
+    def to_record(self) -> dict:
+        return {
+            "user_id": self._user_id,
+            "username": self._username,
+            "hashed_password": self._hashed_password,
+            "salt": self._salt,
+            "registration_date": self._registration_date.isoformat(),
+        }
+
     # setters
 
     @property
@@ -62,24 +198,146 @@ class User:
         }
 
 
-    def change_password(self, new_password: str) -> None:
+    def change_password(self, new_password: str, hasher: PasswordHasher | None = None) -> None:
         if not isinstance(new_password, str) or len(new_password) < 4:
             raise ValueError("Пароль должен быть не короче 4 символов")
-        self._salt = secrets.token_hex(8)
-        self._hashed_password = hashlib.sha256((new_password + self._salt).encode()).hexdigest()
+        hasher = hasher or DEFAULT_HASHER
+        self._salt = secrets.token_hex(16)
+        self._hashed_password = hasher.encode(new_password, self._salt)
 
 
     def verify_password(self, password: str) -> bool:
         if not isinstance(password, str):
             return False
-        hashed = hashlib.sha256((password + self._salt).encode()).hexdigest()
-        return hashed == self._hashed_password
+        try:
+            hasher = hasher_from_encoded(self._hashed_password)
+        except ValueError:
+            return False
+        return hasher.verify(password, self._salt, self._hashed_password)
+
+
+    def needs_rehash(self, hasher: PasswordHasher) -> bool:
+        try:
+            return hasher_from_encoded(self._hashed_password) != hasher
+        except ValueError:
+            return True
+
+
+class CostBasis:
+    """Себестоимость позиции: открытые лоты и реализованный результат.
+
+    Суммы — в единицах хранения валюты себестоимости портфеля
+    (Portfolio.cost_base). units и cost — итоги по открытым лотам, поэтому
+    P&L кошелька считается без обхода лотов. При средней себестоимости
+    открытый лот всегда один.
+    """
+
+    __slots__ = ("lots", "units", "cost", "realized")
+
+    def __init__(self) -> None:
+        self.lots: list[list[int]] = []
+        self.units = 0
+        self.cost = 0
+        self.realized = 0
+
+    @classmethod
+    def from_record(cls, data: dict) -> "CostBasis":
+        basis = cls.__new__(cls)
+        # лоты меняются на месте — запись хранилища копируется, а не разделяется
+        basis.lots = [[int(u), int(c)] for u, c in data.get("lots", [])]
+        basis.units = int(data.get("units", 0))
+        basis.cost = int(data.get("cost", 0))
+        basis.realized = int(data.get("realized", 0))
+        return basis
+
+    def to_record(self) -> dict:
+        return {
+            "lots": self.lots,
+            "units": self.units,
+            "cost": self.cost,
+            "realized": self.realized,
+        }
+
+    def add(self, units: int, cost: int, average: bool = False) -> None:
+        if average and self.lots:
+            self.lots = [[self.units + units, self.cost + cost]]
+        else:
+            self.lots.append([units, cost])
+        self.units += units
+        self.cost += cost
+
+    def remove(self, units: int, proceeds: int | None) -> int:
+        """Списывает units из самых старых лотов и возвращает реализованный результат.
+
+        proceeds — выручка за units в валюте себестоимости; если курса не было
+        (None), лоты списываются без изменения realized.
+        """
+        units = min(units, self.units)
+        removed_cost = 0
+        left = units
+        while left:
+            lot = self.lots[0]
+            take = min(left, lot[0])
+            part = lot[1] if take == lot[0] else lot[1] * take // lot[0]
+            lot[0] -= take
+            lot[1] -= part
+            if lot[0] == 0:
+                self.lots.pop(0)
+            removed_cost += part
+            left -= take
+
+        self.units -= units
+        self.cost -= removed_cost
+        if proceeds is None:
+            return 0
+        self.realized += proceeds - removed_cost
+        return proceeds - removed_cost
 
 
 class Wallet:
-    def __init__(self, currency_code: str, balance: float = 0.0):
+    """Кошелёк одной валюты; баланс хранится целым числом единиц (10**-decimals валюты).
+
+    basis — себестоимость части баланса, купленной при известном курсе;
+    остаток (untracked_units) в P&L не участвует.
+    """
+
+    __slots__ = ("_currency_code", "_units", "_basis")
+
+    def __init__(self, currency_code: str, balance=0):
         self.currency_code = currency_code
         self.balance = balance
+        self._basis: CostBasis | None = None
+
+    @classmethod
+    def from_storage(
+        cls, currency_code: str, units: int, basis: CostBasis | None = None
+    ) -> "Wallet":
+        """Кошелёк из уже проверенных данных хранилища, без повторной валидации."""
+        wallet = cls.__new__(cls)
+        wallet._currency_code = currency_code
+        wallet._units = units
+        wallet._basis = basis
+        return wallet
+
+    def to_record(self) -> dict:
+        if self._basis is None:
+            return {"units": self._units}
+        return {"units": self._units, "basis": self._basis.to_record()}
+
+    @property
+    def basis(self) -> CostBasis:
+        if self._basis is None:
+            self._basis = CostBasis()
+        return self._basis
+
+    @property
+    def has_basis(self) -> bool:
+        return self._basis is not None
+
+    @property
+    def untracked_units(self) -> int:
+        """Часть баланса без известной себестоимости (куплена до учёта или без курса)."""
+        return self._units - (self._basis.units if self._basis is not None else 0)
 
     @property
     def currency_code(self) -> str:
@@ -92,83 +350,174 @@ class Wallet:
         self._currency_code = value.strip().upper()
 
     @property
-    def balance(self) -> float:
-        return self._balance
+    def units(self) -> int:
+        return self._units
+
+    @property
+    def balance(self) -> Decimal:
+        return from_units(self._units, self._currency_code)
 
     @balance.setter
-    def balance(self, value: float) -> None:
-        if not isinstance(value, (int, float)):
+    def balance(self, value) -> None:
+        if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
             raise TypeError("balance должен быть числом")
-        if value < 0:
+        units = to_units(value, self._currency_code)
+        if units < 0:
             raise ValueError("balance не может быть отрицательным")
-        self._balance = value
+        self._units = units
 
-    def deposit(self, amount: float) -> None:
-        if not isinstance(amount, (int, float)) or float(amount) <= 0:
+    def _amount_units(self, amount) -> int:
+        if isinstance(amount, bool) or not isinstance(amount, (int, float, Decimal, str)):
             raise ValueError("'amount' должен быть положительным числом")
-        self._balance += float(amount)
-
-    def withdraw(self, amount: float) -> None:
-        if not isinstance(amount, (int, float)) or float(amount) <= 0:
+        units = to_units(amount, self._currency_code)
+        if units <= 0:
             raise ValueError("'amount' должен быть положительным числом")
-        amount = float(amount)
-        if amount > self._balance:
-            raise ValueError("Недостаточно средств")
-        self._balance -= amount
+        return units
+
+    def deposit(self, amount) -> None:
+        self._units += self._amount_units(amount)
+
+    def withdraw(self, amount) -> None:
+        units = self._amount_units(amount)
+        if units > self._units:
+            raise InsufficientFundsError(
+                self.balance, from_units(units, self._currency_code), self._currency_code
+            )
+        self._units -= units
 
     def get_balance_info(self) -> str:
-        return f"Баланс: {self._balance:.4f} {self._currency_code}"
+        return f"Баланс: {self.balance:f} {self._currency_code}"
 
 
 class Portfolio:
+    __slots__ = ("_user_id", "_wallets", "version", "cost_base")
+
     def __init__(self, user_id: int):
         self._user_id = int(user_id)
-        self._wallets = {}
+        self._wallets: dict[str, Wallet] = {}
+        self.version = 0
+        # валюта, в которой ведётся себестоимость; задаётся первой сделкой с известным курсом
+        self.cost_base: str | None = None
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Portfolio":
+        """Портфель прямо из записи хранилища; запись только читается, не копируется."""
+        portfolio = cls.__new__(cls)
+        portfolio._user_id = record["user_id"]
+        portfolio.version = record.get("version", 0)
+        portfolio.cost_base = record.get("cost_base")
+        portfolio._wallets = {
+            code: Wallet.from_storage(
+                code,
+                wallet_units(data, code),
+                CostBasis.from_record(data["basis"]) if "basis" in data else None,
+            )
+            for code, data in record.get("wallets", {}).items()
+        }
+        return portfolio
+
+    def to_record(self) -> dict:
+        record = {
+            "user_id": self._user_id,
+            "wallets": {code: w.to_record() for code, w in self._wallets.items()},
+            "version": self.version,
+        }
+        if self.cost_base is not None:
+            record["cost_base"] = self.cost_base
+        return record
 
     @property
     def user(self) -> int:
         return self._user_id
 
     @property
-    def wallets(self) -> dict:
-        return self._wallets.copy()
+    def wallets(self) -> Mapping[str, Wallet]:
+        """Кошельки только для чтения (без копирования); новые — через add_currency."""
+        return MappingProxyType(self._wallets)
 
-    def add_currency(self, currency_code: str):
+    def add_currency(self, currency_code: str) -> Wallet:
         code = str(currency_code).strip().upper()
         if not code:
             raise ValueError("currency_code должен быть непустой строкой")
         if code in self._wallets:
             raise ValueError("Код валюты должен быть уникален")
-        self._wallets[code] = Wallet(currency_code=code, balance=0.0)
+        wallet = Wallet(currency_code=code)
+        self._wallets[code] = wallet
+        return wallet
 
     def get_wallet(self, currency_code: str) -> Wallet | None:
         code = str(currency_code).strip().upper()
         return self._wallets.get(code)
 
-    def get_total_value(self, base_currency: str = "USD") -> float:
-        exchange_rates = {
-            "USD_USD": 1,
-            "EUR_USD": 1.1,
-            "BTC_USD": 60000,
-            "ETH_USD": 3720,
-            "RUB_USD": 0.01,
-        }
-
+    def value_units(self, base_currency: str, rates: RateProvider) -> dict[str, int]:
+        """Стоимость каждого кошелька в единицах хранения base_currency за один проход."""
         base = str(base_currency).strip().upper()
         if not base:
             raise ValueError("base_currency должен быть непустой строкой")
 
-        total = 0.0
+        values = {}
         for code, wallet in self._wallets.items():
             if code == base:
-                total += wallet.balance
+                values[code] = wallet.units
                 continue
 
-            pair = f"{code}_{base}"
-            rate = exchange_rates.get(pair)
-            if not rate:
-                raise ValueError(f"Не удалось получить курс для {code}→{base}")
+            found = rates.get(code, base)
+            if found is None:
+                raise ApiRequestError(f"Курс {code}_{base} недоступен")
+
+            values[code] = convert_units(wallet.units, code, found[0], base)
+
+        return values
+
+    def pnl_units(self, rates: RateProvider) -> dict[str, dict]:
+        """P&L кошельков с себестоимостью в единицах хранения cost_base.
+
+        Для каждой валюты: units (учтённая часть баланса), untracked, cost,
+        value по текущему курсу, unrealized = value - cost и realized;
+        value и unrealized — None, если курса нет. Время — O(число валют).
+        """
+        result = {}
+        base = self.cost_base
+        if base is None:
+            return result
 
-            total += wallet.balance * float(rate)
+        for code, wallet in self._wallets.items():
+            if not wallet.has_basis:
+                continue
+            basis = wallet.basis
 
-        return total
+            value = None
+            if code == base:
+                value = basis.units
+            else:
+                found = rates.get(code, base)
+                if found is not None:
+                    value = convert_units(basis.units, code, found[0], base)
+
+            result[code] = {
+                "units": basis.units,
+                "untracked": wallet.untracked_units,
+                "cost": basis.cost,
+                "value": value,
+                "unrealized": value - basis.cost if value is not None else None,
+                "realized": basis.realized,
+            }
+        return result
+
+    def get_total_value(
+        self, base_currency: str = "USD", rates: RateProvider | None = None
+    ) -> Decimal:
+        """Общая стоимость портфеля в base_currency.
+
+        rates — любой источник с методом get(src, dst), обычно RateMatrix
+        из RateService.get_matrix(); при оценке многих портфелей его стоит
+        получить один раз и передавать в каждый вызов.
+        """
+        if rates is None:
+            # импорт здесь: usecases сам импортирует модели
+            from valutatrade_hub.core.usecases import RateService
+
+            rates = RateService().get_matrix()
+
+        base = str(base_currency).strip().upper()
+        return from_units(sum(self.value_units(base, rates).values()), base)
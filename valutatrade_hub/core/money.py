@@ -0,0 +1,57 @@
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+
+from valutatrade_hub.core.currencies import get_currency
+
+
+def scale(code: str) -> int:
+    """Число целых единиц хранения в одной единице валюты (10 ** decimals)."""
+    return 10 ** get_currency(code).decimals
+
+
+def to_units(amount, code: str) -> int:
+    """Сумма (int, float, Decimal или строка) -> целое число единиц хранения.
+
+    Сумма с большим числом знаков после запятой, чем допускает валюта,
+    отклоняется, а не округляется молча.
+    """
+    if isinstance(amount, bool):
+        raise ValueError("'amount' должен быть положительным числом")
+    try:
+        # str(float) даёт кратчайшее представление: 0.1 -> Decimal("0.1")
+        value = Decimal(str(amount)) if isinstance(amount, float) else Decimal(amount)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError("'amount' должен быть положительным числом")
+    if not value.is_finite():
+        raise ValueError("'amount' должен быть положительным числом")
+
+    currency = get_currency(code)
+    units = value.scaleb(currency.decimals)
+    if units != units.to_integral_value():
+        raise ValueError(
+            f"Для {currency.code} допускается не больше {currency.decimals} знаков после запятой"
+        )
+    return int(units)
+
+
+def from_units(units: int, code: str) -> Decimal:
+    return Decimal(units).scaleb(-get_currency(code).decimals)
+
+
+def wallet_units(wallet: dict, code: str) -> int:
+    """Баланс кошелька из хранилища в единицах хранения.
+
+    Старые записи хранят баланс числом с плавающей точкой в поле balance —
+    он округляется до точности валюты.
+    """
+    if "units" in wallet:
+        return int(wallet["units"])
+    balance = Decimal(str(wallet.get("balance", 0)))
+    return int(balance.scaleb(get_currency(code).decimals).to_integral_value(ROUND_HALF_EVEN))
+
+
+def convert_units(units: int, src_code: str, rate: float, dst_code: str) -> int:
+    """Перевод units валюты src_code по курсу rate в единицы хранения dst_code."""
+    per_unit = Decimal(repr(rate)).scaleb(
+        get_currency(dst_code).decimals - get_currency(src_code).decimals
+    )
+    return int((units * per_unit).to_integral_value(ROUND_HALF_EVEN))
@@ -0,0 +1,97 @@
+import math
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Iterable
+
+from valutatrade_hub.core.currencies import get_registry
+
+
+class RateMatrix:
+    """Курсы всех валют реестра друг к другу.
+
+    Строится один раз по парам rates.json: недостающие пары вычисляются
+    через путь с наименьшим числом пересчётов (обычно через USD).
+    Строки и столбцы — id валют из реестра (currency_id), поэтому
+    rates[i * n + j] — курс валюты с id i в валюте с id j, updated[i * n + j] —
+    время самого старого курса на этом пути (unix time). Пары с валютами,
+    которых нет в реестре, пропускаются.
+    """
+
+    def __init__(self, rates: array, updated: array) -> None:
+        registry = get_registry()
+        self.codes = registry.codes
+        self.index = registry.ids
+        self.size = len(registry)
+        self.rates = rates
+        self.updated = updated
+
+    @classmethod
+    def from_pairs(cls, pairs: dict) -> "RateMatrix":
+        """Матрица по словарю пар в формате rates.json."""
+        return cls.from_entries(
+            (pair, float(entry["rate"]), datetime.fromisoformat(entry["updated_at"]).timestamp())
+            for pair, entry in pairs.items()
+        )
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[tuple]) -> "RateMatrix":
+        """Матрица по записям (пара, курс, updated_at в unix time, ...)."""
+        index = get_registry().ids
+        edges = []
+        for pair, rate, ts, *_ in entries:
+            src, dst = pair.split("_")
+            i = index.get(src)
+            j = index.get(dst)
+            if i is not None and j is not None:
+                edges.append((i, j, rate, ts))
+        return cls.from_edges(edges)
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[tuple[int, int, float, float]]) -> "RateMatrix":
+        """Матрица по рёбрам (id валюты, id валюты, курс, updated_at в unix time)."""
+        n = len(get_registry())
+        graph: dict[int, list[tuple[int, float, float]]] = {}
+
+        for i, j, rate, ts in edges:
+            if rate <= 0:
+                continue
+            graph.setdefault(i, []).append((j, rate, ts))
+            graph.setdefault(j, []).append((i, 1 / rate, ts))
+
+        rates = array("d", [math.nan]) * (n * n)
+        updated = array("d", [math.nan]) * (n * n)
+
+        for src in graph:
+            row = src * n
+            rates[row + src] = 1.0
+            updated[row + src] = math.inf
+
+            # BFS: первым найденным оказывается путь с минимумом пересчётов
+            queue = deque([src])
+            while queue:
+                cur = queue.popleft()
+                cur_rate = rates[row + cur]
+                cur_ts = updated[row + cur]
+                for nxt, rate, ts in graph[cur]:
+                    cell = row + nxt
+                    if not math.isnan(rates[cell]):
+                        continue
+                    rates[cell] = cur_rate * rate
+                    updated[cell] = min(cur_ts, ts)
+                    queue.append(nxt)
+
+        return cls(rates, updated)
+
+    def get(self, src: str, dst: str) -> tuple[float, float] | None:
+        """Курс src→dst и время его обновления либо None, если курса нет."""
+        i = self.index.get(src)
+        j = self.index.get(dst)
+        if i is None or j is None:
+            return None
+
+        cell = i * self.size + j
+        rate = self.rates[cell]
+        if math.isnan(rate):
+            return None
+        return rate, self.updated[cell]
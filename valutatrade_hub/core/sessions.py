@@ -0,0 +1,46 @@
+import secrets
+import threading
+import time
+
+from valutatrade_hub.core.models import User
+
+
+class SessionCache:
+    """Токены сессий: после одного входа пароль (и дорогой KDF) больше не проверяется."""
+
+    def __init__(self, ttl_seconds: int = 3600) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sessions: dict[str, tuple[User, float]] = {}
+
+    def create(self, user: User) -> str:
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            self._sessions[token] = (user, now + self.ttl_seconds)
+        return token
+
+    def _purge(self, now: float) -> None:
+        # TTL у всех сессий одинаковый, поэтому порядок вставки совпадает с порядком истечения:
+        # просроченные лежат в начале словаря
+        while self._sessions:
+            token, (_, expires_at) = next(iter(self._sessions.items()))
+            if expires_at >= now:
+                break
+            del self._sessions[token]
+
+    def get(self, token: str) -> User | None:
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._sessions[token]
+                return None
+            return user
+
+    def revoke(self, token: str) -> None:
+        with self._lock:
+            self._sessions.pop(token, None)
@@ -1,16 +1,27 @@
 from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.ledger import TradeLedger
+from valutatrade_hub.infra.rate_snapshot import SNAPSHOT_FILENAME, RateSnapshot, SnapshotData
 from valutatrade_hub.infra.settings import SettingsLoader
 from valutatrade_hub.core.currencies import get_currency
 from valutatrade_hub.core.exceptions import (
     CurrencyNotFoundError,
-    InsufficientFundsError,
     ApiRequestError,
+    ConcurrentUpdateError,
 )
 from valutatrade_hub.decorators import log_action
-from valutatrade_hub.core.models import User
+from valutatrade_hub.core.models import Portfolio, User, make_hasher
+from valutatrade_hub.core.money import convert_units, from_units, to_units
+from valutatrade_hub.core.sessions import SessionCache
+from valutatrade_hub.core.rate_matrix import RateMatrix
+from valutatrade_hub.parser_service.config import ParserConfig
+from valutatrade_hub.parser_service.history import HistoryStore
 
 import datetime
+import random
+import time
+from contextlib import nullcontext
 from datetime import datetime, timezone
+from decimal import Decimal
 
 
 
@@ -25,240 +36,473 @@ class AuthService:
         self.db = DatabaseManager()
         self.settings = SettingsLoader()
         self.current_user: User | None = None
+        self.hasher = make_hasher(
+            self.settings.get("PASSWORD_HASHER", "scrypt"),
+            **self.settings.get("PASSWORD_HASHER_PARAMS", {}),
+        )
+        self.sessions = SessionCache(int(self.settings.get("SESSION_TTL_SECONDS", 3600)))
 
     def register(self, username: str, password: str) -> None:
+        user = self.create_user(username, password)
+        print(
+            f"Пользователь '{username}' зарегистрирован (id={user.user_id}). "
+            f"Войдите: login --username {username} --password ****"
+        )
+
+    def create_user(self, username: str, password: str) -> User:
         if not isinstance(username, str) or not username.strip():
             raise ValueError("Имя пользователя не может быть пустым")
         if not isinstance(password, str) or len(password) < 4:
             raise ValueError("Пароль должен быть не короче 4 символов")
 
-        users = self.db.read("users.json")
-
-        for u in users:
-            if u["username"] == username:
+        with self.db.locked("users"):
+            if self.db.get_user_by_username(username) is not None:
                 raise ValueError(f"Имя пользователя '{username}' уже занято")
 
-        next_id = max((u["user_id"] for u in users), default=0) + 1
+            next_id = self.db.next_user_id()
 
-        user = User(
-            user_id=next_id,
-            username=username,
-            hashed_password="",
-            salt="",
-            registration_date=datetime.now(),
-        )
-        user.change_password(password)
+            user = User(
+                user_id=next_id,
+                username=username,
+                hashed_password="",
+                salt="",
+                registration_date=datetime.now(),
+            )
+            user.change_password(password, self.hasher)
 
-        users.append({
-            "user_id": user.user_id,
-            "username": user.username,
-            "hashed_password": user.hashed_password,
-            "salt": user.salt,
-            "registration_date": user.registration_date.isoformat(),
-        })
-
-        self.db.write("users.json", users)
+            self.db.add_user(user.to_record())
+            self.db.save_portfolio(Portfolio(next_id).to_record())
 
-        portfolios = self.db.read("portfolios.json")
-        portfolios.append({
-            "user_id": next_id,
-            "wallets": {}
-        })
-        self.db.write("portfolios.json", portfolios)
+        return user
 
-        print(
-            f"Пользователь '{username}' зарегистрирован (id={next_id}). "
-            f"Войдите: login --username {username} --password ****"
-        )
+    def login(self, username: str, password: str) -> str:
+        user = self.check_credentials(username, password)
+        self.current_user = user
+        print(f"Вы вошли как '{username}'")
+        return self.sessions.create(user)
 
-    def login(self, username: str, password: str) -> None:
+    def check_credentials(self, username: str, password: str) -> User:
+        """Проверяет пароль (и при необходимости перехеширует его), не меняя current_user."""
         if not isinstance(username, str) or not username.strip():
             raise ValueError("Имя пользователя не может быть пустым")
         if not isinstance(password, str):
             raise ValueError("Пароль обязателен")
 
-        users = self.db.read("users.json")
-
-        for data in users:
-            if data["username"] == username:
-                user = User(
-                    user_id=data["user_id"],
-                    username=data["username"],
-                    hashed_password=data["hashed_password"],
-                    salt=data["salt"],
-                    registration_date=datetime.fromisoformat(
-                        data["registration_date"]
-                    ),
-                )
+        data = self.db.get_user_by_username(username)
+        if data is None:
+            raise ValueError(f"Пользователь '{username}' не найден")
 
-                if not user.verify_password(password):
-                    raise ValueError("Неверный пароль")
+        user = User.from_record(data)
 
-                self.current_user = user
-                print(f"Вы вошли как '{username}'")
-                return
+        if not user.verify_password(password):
+            raise ValueError("Неверный пароль")
 
-        raise ValueError(f"Пользователь '{username}' не найден")
+        if user.needs_rehash(self.hasher):
+            user.change_password(password, self.hasher)
+            with self.db.locked("users"):
+                self.db.update_user(user.to_record())
+
+        return user
+
+    def authenticate(self, token: str) -> User:
+        user = self.sessions.get(token)
+        if user is None:
+            raise ValueError("Сессия не найдена или истекла. Выполните login")
+        return user
 
   
 
 
+# блокировки повторов: пользователи распределяются по ним по user_id
+RETRY_LOCKS = 64
+
+
 class PortfolioService:
+    MAX_RETRIES = 10
+    # базовая пауза перед повтором, секунды; удваивается с каждой попыткой
+    RETRY_BACKOFF = 0.002
+
     def __init__(self, auth_service):
         self.auth_service = auth_service
         self.db = DatabaseManager()
         self.settings = SettingsLoader()
+        self.rates = RateService()
+        self.ledger = TradeLedger(
+            self.settings.get("DATA_DIR") / "ledger",
+            group_size=self.settings.get("JOURNAL_GROUP_SIZE", 32),
+            flush_interval=self.settings.get("JOURNAL_FLUSH_INTERVAL_MS", 50) / 1000,
+        )
+        # сделки незавершённой транзакции (пакетный режим): в журнал попадут после commit
+        self._uncommitted: tuple[int | None, list[dict]] = (None, [])
 
 
-    def show_portfolio(self, base_currency: str = "USD") -> dict:
-        user = self.auth_service.current_user
+    def _resolve_user(self, user: User | None) -> User:
+        """Явно переданный пользователь (сессия API) или вошедший в CLI."""
+        user = user or self.auth_service.current_user
         if not user:
             raise ValueError("Сначала выполните login")
+        return user
+
+    def show_portfolio(
+        self,
+        base_currency: str = "USD",
+        user: User | None = None,
+        as_of: datetime | None = None,
+    ) -> dict:
+        """Стоимость кошельков в base_currency по текущим курсам.
+
+        С as_of текущие балансы оцениваются по курсам, действовавшим в этот
+        момент, из истории курсов.
+        """
+        user = self._resolve_user(user)
 
         base = get_currency(base_currency)
 
-        portfolios = self.db.read("portfolios.json")
-
-        for p in portfolios:
-            if p["user_id"] != user.user_id:
-                continue
-
-            wallets = p.get("wallets", {})
-            if not wallets:
-                return {
-                    "user": user.username,
-                    "base": base.code,
-                    "items": [],
-                    "total": 0.0,
-                }
-
-            rates_data = self.db.read("rates.json")
-            pairs = rates_data.get("pairs", {})
-
-            result = []
-            total = 0.0
-
-            for code, data in wallets.items():
-                currency = get_currency(code)
-                balance = float(data.get("balance", 0.0))
-
-                if currency.code == base.code:
-                    value = balance
-                else:
-                    pair = f"{currency.code}_{base.code}"
-                    if pair not in pairs:
-                        raise ApiRequestError(f"Курс {pair} недоступен")
-
-                    rate = float(pairs[pair]["rate"])
-                    value = balance * rate
-
-                total += value
-                result.append(
-                    {
-                        "currency": currency.code,
-                        "balance": balance,
-                        "value": value,
-                    }
-                )
+        p = self.db.load_portfolio(user.user_id)
+        if p is None:
+            raise ValueError("Портфель пользователя не найден")
 
+        wallets = p.wallets
+        if not wallets:
             return {
                 "user": user.username,
                 "base": base.code,
-                "items": result,
-                "total": total,
+                "items": [],
+                "total": from_units(0, base.code),
             }
 
-        raise ValueError("Портфель пользователя не найден")
+        matrix = self.rates.get_matrix() if as_of is None else self.rates.get_matrix_at(as_of)
+        values = p.value_units(base.code, matrix)
 
+        result = [
+            {
+                "currency": code,
+                "balance": wallet.balance,
+                "value": from_units(values[code], base.code),
+            }
+            for code, wallet in wallets.items()
+        ]
+        total_units = sum(values.values())
+
+        return {
+            "user": user.username,
+            "base": base.code,
+            "items": result,
+            "total": from_units(total_units, base.code),
+        }
 
 
 
 
-    @log_action("BUY")
-    def buy(self, currency: str, amount: float) -> None:
-        if not isinstance(amount, (int, float)) or amount <= 0:
-            raise ValueError("'amount' должен быть положительным числом")
 
+    @log_action("BUY")
+    def buy(self, currency: str, amount, user: User | None = None) -> dict:
         cur = get_currency(currency)
+        amount = self._parse_amount(amount, cur.code)
+        units = to_units(amount, cur.code)
 
-        user = self.auth_service.current_user
-        if not user:
-            raise ValueError("Сначала выполните login")
+        user = self._resolve_user(user)
 
-        portfolios = self.db.read("portfolios.json")
+        def apply(p: Portfolio) -> None:
+            wallet = p.get_wallet(cur.code) or p.add_currency(cur.code)
+            wallet.deposit(amount)
 
-        for p in portfolios:
-            if p["user_id"] == user.user_id:
-                wallets = p.setdefault("wallets", {})
-                w = wallets.setdefault(cur.code, {"balance": 0.0})
-                w["balance"] += amount
-                self.db.write("portfolios.json", portfolios)
-                return
+            cost = self._cost_units(p, cur.code, units)
+            if cost is not None:
+                wallet.basis.add(units, cost, average=self._average_cost())
 
-        raise ValueError("Портфель пользователя не найден")
-    
-    
+        self._update_portfolio(user, apply)
+        return self._record_trade(user, "BUY", cur.code, amount)
 
     @log_action("SELL")
-    def sell(self, currency: str, amount: float) -> None:
-        if not isinstance(amount, (int, float)) or amount <= 0:
-            raise ValueError("'amount' должен быть положительным числом")
-
+    def sell(self, currency: str, amount, user: User | None = None) -> dict:
         cur = get_currency(currency)
+        amount = self._parse_amount(amount, cur.code)
+        units = to_units(amount, cur.code)
+
+        user = self._resolve_user(user)
+        realized = None
+
+        def apply(p: Portfolio) -> None:
+            nonlocal realized
+            wallet = p.get_wallet(cur.code)
+            if wallet is None:
+                raise CurrencyNotFoundError(cur.code)
+            # сначала продаётся часть без себестоимости: она старше учёта
+            tracked = max(0, units - wallet.untracked_units)
+            wallet.withdraw(amount)
+
+            realized = None
+            if tracked and wallet.has_basis:
+                proceeds = self._cost_units(p, cur.code, tracked)
+                pnl = wallet.basis.remove(tracked, proceeds)
+                if proceeds is not None:
+                    realized = from_units(pnl, p.cost_base)
+
+        self._update_portfolio(user, apply)
+        return self._record_trade(user, "SELL", cur.code, amount, realized)
+
+    def _average_cost(self) -> bool:
+        method = self.settings.get("COST_BASIS_METHOD", "fifo")
+        if method not in ("fifo", "average"):
+            raise ValueError("cost_basis_method должен быть 'fifo' или 'average'")
+        return method == "average"
+
+    def _cost_units(self, p: Portfolio, code: str, units: int) -> int | None:
+        """Стоимость units валюты code в единицах валюты себестоимости портфеля (None — курса нет)."""
+        base = p.cost_base or get_currency(self.settings.get("DEFAULT_BASE_CURRENCY", "USD")).code
+        rate = self._trade_rate(code, base)
+        if rate is None:
+            return None
+
+        p.cost_base = base
+        return convert_units(units, code, rate, base)
+
+    def pnl(self, user: User | None = None) -> dict:
+        """Нереализованный (по текущим курсам) и реализованный результат по кошелькам."""
+        user = self._resolve_user(user)
+        p = self.db.load_portfolio(user.user_id)
+        if p is None:
+            raise ValueError("Портфель пользователя не найден")
+        if p.cost_base is None:
+            return {"user": user.username, "base": None, "items": [], "unrealized": None, "realized": None}
+
+        base = p.cost_base
+        rows = p.pnl_units(self.rates.get_matrix())
+
+        def money(units):
+            return from_units(units, base) if units is not None else None
+
+        items = [
+            {
+                "currency": code,
+                "balance": from_units(row["units"], code),
+                "untracked": from_units(row["untracked"], code),
+                "cost": money(row["cost"]),
+                "value": money(row["value"]),
+                "unrealized": money(row["unrealized"]),
+                "realized": money(row["realized"]),
+            }
+            for code, row in rows.items()
+        ]
+        unrealized = [row["unrealized"] for row in rows.values()]
+        return {
+            "user": user.username,
+            "base": base,
+            "items": items,
+            "unrealized": money(sum(unrealized)) if None not in unrealized else None,
+            "realized": money(sum(row["realized"] for row in rows.values())),
+        }
+
+    def _record_trade(
+        self, user: User, action: str, code: str, amount: Decimal, realized: Decimal | None = None
+    ) -> dict:
+        """Запись исполненной сделки в журнал сделок с курсом к базовой валюте на момент исполнения.
+
+        realized — реализованный результат продажи в валюте себестоимости портфеля.
+        """
+        base = get_currency(self.settings.get("DEFAULT_BASE_CURRENCY", "USD")).code
+        rate = self._trade_rate(code, base)
+
+        base_value = None
+        if rate is not None:
+            base_value = from_units(convert_units(to_units(amount, code), code, rate, base), base)
+
+        trade = {
+            "user_id": user.user_id,
+            "action": action,
+            "currency": code,
+            "amount": str(amount),
+            "rate": rate,
+            "base": base,
+            "base_value": str(base_value) if base_value is not None else None,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        if realized is not None:
+            trade["realized"] = str(realized)
+        # в пакетном режиме сделка попадает в журнал только после записи портфелей
+        transaction = self.db.transaction_id
+        if transaction is not None:
+            if self._uncommitted[0] != transaction:
+                self._uncommitted = (transaction, [])
+            self._uncommitted[1].append(trade)
+        self.db.after_commit(lambda: self.ledger.append(trade))
+        return trade
+
+    def _trade_rate(self, code: str, base: str) -> float | None:
+        """Курс code→base для учёта сделки; None, если курса нет или снимок курсов не читается.
+
+        Сделка исполняется и без курса: себестоимость и стоимость в базовой
+        валюте тогда просто не учитываются.
+        """
+        if code == base:
+            return 1.0
+        try:
+            found = self.rates.get_matrix().get(code, base)
+        except (OSError, ValueError):
+            return None
+        return found[0] if found is not None else None
+
+    def trade_history(self, limit: int = 10, user: User | None = None) -> list[dict]:
+        """Последние limit сделок пользователя, новые первыми."""
+        user = self._resolve_user(user)
+        if limit <= 0:
+            raise ValueError("'limit' должен быть положительным числом")
+
+        transaction, trades = self._uncommitted
+        pending = []
+        if transaction is not None and transaction == self.db.transaction_id:
+            pending = [t for t in reversed(trades) if t["user_id"] == user.user_id][:limit]
+        return pending + self.ledger.tail(user.user_id, limit - len(pending))
+
+    @staticmethod
+    def _parse_amount(amount, code: str) -> Decimal:
+        """Сумма сделки (число, Decimal или строка из CLI) с точностью валюты."""
+        units = to_units(amount, code)
+        if units <= 0:
+            raise ValueError("'amount' должен быть положительным числом")
+        return from_units(units, code)
 
-        user = self.auth_service.current_user
-        if not user:
-            raise ValueError("Сначала выполните login")
-
-        portfolios = self.db.read("portfolios.json")
+    def _update_portfolio(self, user: User, apply) -> None:
+        """Читает портфель, применяет изменение и сохраняет его.
 
-        for p in portfolios:
-            if p["user_id"] == user.user_id:
-                wallets = p.get("wallets", {})
-                if cur.code not in wallets:
-                    raise CurrencyNotFoundError(cur.code)
+        Если портфель успели изменить в другом процессе (не совпала version),
+        операция повторяется на свежих данных после паузы со случайным разбросом,
+        а чтение-изменение-запись повторов идёт под блокировкой пользователя:
+        повторы разных процессов не сталкиваются друг с другом.
+        """
+        for attempt in range(self.MAX_RETRIES):
+            if attempt:
+                time.sleep(random.uniform(0, self.RETRY_BACKOFF * 2 ** min(attempt, 6)))
 
-                balance = wallets[cur.code].get("balance", 0.0)
-                if amount > balance:
-                    raise InsufficientFundsError(balance, amount, cur.code)
+            lock = self.db.locked(f"retry_{user.user_id % RETRY_LOCKS}") if attempt else nullcontext()
+            with lock:
+                p = self.db.load_portfolio(user.user_id)
+                if p is None:
+                    raise ValueError("Портфель пользователя не найден")
 
-                wallets[cur.code]["balance"] -= amount
-                self.db.write("portfolios.json", portfolios)
-                return
+                apply(p)
+                try:
+                    self.db.save_portfolio(p.to_record())
+                    return
+                except ConcurrentUpdateError:
+                    continue
 
-        raise ValueError("Портфель пользователя не найден")
+        raise ConcurrentUpdateError(user.user_id)
 
 
 
 
 
 class RateService:
+    _matrix: RateMatrix | None = None
+    _matrix_key: tuple | None = None
+    _snapshot: RateSnapshot | None = None
+    # поколение, на котором чтение снимка не удалось (писатель упал посреди записи)
+    _stuck_generation: int | None = None
+
     def __init__(self):
         self.db = DatabaseManager()
         self.settings = SettingsLoader()
 
-    def get_rate(self, from_currency: str, to_currency: str) -> dict:
-        src = get_currency(from_currency)
-        dst = get_currency(to_currency)
+    def _binary_snapshot(self) -> RateSnapshot | None:
+        """Общий mmap-снимок rates.bin либо None, если его нет или он записан по другому
+        реестру валют (тогда читается rates.json до пересборки снимка в update-rates)."""
+        path = self.settings.get("DATA_DIR") / SNAPSHOT_FILENAME
+        if RateService._snapshot is None or RateService._snapshot.path != path:
+            RateService._snapshot = RateSnapshot(path)
+        if not RateService._snapshot.is_current():
+            return None
+        return RateService._snapshot
+
+    @staticmethod
+    def _read_binary(snapshot: RateSnapshot, generation: int) -> SnapshotData | None:
+        """Согласованное чтение снимка либо None, если оно не удаётся.
+
+        Поколение остаётся нечётным, если писатель упал между двумя его
+        увеличениями; до следующего update-rates такой снимок не читается,
+        и курсы берутся из rates.json. Зависшее поколение запоминается, чтобы
+        не ждать READ_TIMEOUT на каждом запросе.
+        """
+        if generation == RateService._stuck_generation:
+            return None
+        try:
+            return snapshot.read()
+        except (TimeoutError, ValueError):
+            RateService._stuck_generation = generation
+            return None
+
+    def get_matrix(self) -> RateMatrix:
+        """Матрица кросс-курсов, перестраивается только при смене поколения снимка."""
+        snapshot = self._binary_snapshot()
+        if snapshot is not None:
+            generation = snapshot.generation()
+            if RateService._matrix is not None and RateService._matrix_key == ("bin", generation):
+                return RateService._matrix
+
+            data = self._read_binary(snapshot, generation)
+            if data is not None:
+                RateService._matrix = RateMatrix.from_edges(
+                    (src, dst, rate, ts) for src, dst, _, rate, ts in data.records
+                )
+                RateService._matrix_key = ("bin", data.generation)
+                return RateService._matrix
 
         data = self.db.read("rates.json")
-        pairs = data.get("pairs", {})
+        key = ("json", data.get("last_refresh"))
+        if RateService._matrix is None or RateService._matrix_key != key:
+            RateService._matrix = RateMatrix.from_pairs(data.get("pairs", {}))
+            RateService._matrix_key = key
+
+        return RateService._matrix
+
+    def get_matrix_at(self, when: datetime) -> RateMatrix:
+        """Матрица кросс-курсов, действовавших в момент when, по истории курсов."""
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        if when > datetime.now(timezone.utc):
+            raise ValueError("Момент оценки не может быть в будущем")
+
+        history = HistoryStore(ParserConfig().HISTORY_DIR_PATH)
+        entries = history.rates_at(when.timestamp())
+        if not entries:
+            raise ValueError(f"В истории нет курсов на {when.isoformat()}")
+        return RateMatrix.from_entries(entries)
+
+    def get_snapshot(self) -> dict:
+        """Все пары снимка в формате rates.json: {"pairs": {...}, "last_refresh": ...}."""
+        snapshot = self._binary_snapshot()
+        data = None if snapshot is None else self._read_binary(snapshot, snapshot.generation())
+        if data is None:
+            return self.db.read("rates.json")
+
+        def iso(ts: float) -> str:
+            return datetime.fromtimestamp(ts, timezone.utc).isoformat()
 
-        direct_key = f"{src.code}_{dst.code}"
-        reverse_key = f"{dst.code}_{src.code}"
+        return {
+            "pairs": {
+                e.pair: {"rate": e.rate, "updated_at": iso(e.updated_at), "source": e.source}
+                for e in data.entries()
+            },
+            "last_refresh": iso(data.last_refresh) if data.last_refresh is not None else None,
+        }
 
-        if direct_key in pairs:
-            entry = pairs[direct_key]
-            rate = entry["rate"]
+    def get_rate(self, from_currency: str, to_currency: str) -> dict:
+        src = get_currency(from_currency)
+        dst = get_currency(to_currency)
 
-        elif reverse_key in pairs:
-            entry = pairs[reverse_key]
-            rate = 1 / entry["rate"]
+        if src.code == dst.code:
+            return {
+                "rate": 1.0,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
 
-        else:
+        found = self.get_matrix().get(src.code, dst.code)
+        if found is None:
             raise ApiRequestError(f"Курс {src.code}_{dst.code} недоступен")
 
-        updated_at = datetime.fromisoformat(entry["updated_at"])
+        rate, updated_ts = found
+        updated_at = datetime.fromtimestamp(updated_ts, timezone.utc)
         now = datetime.now(timezone.utc)
 
         ttl = int(self.settings.get("RATES_TTL_SECONDS", 300))
@@ -269,5 +513,5 @@ class RateService:
 
         return {
             "rate": round(rate, 4),
-            "updated_at": entry["updated_at"],
-        }
\ No newline at end of file
+            "updated_at": updated_at.isoformat(),
+        }
@@ -0,0 +1,167 @@
+import numpy as np
+
+from valutatrade_hub.core.currencies import currency_id, get_currency
+from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.core.money import convert_units, from_units, wallet_units
+from valutatrade_hub.core.usecases import RateService
+from valutatrade_hub.infra.database import DatabaseManager
+
+
+class BulkValuation:
+    """Переоценка всех портфелей одной матричной операцией.
+
+    Балансы загружаются в плотную матрицу пользователи × валюты в целых
+    единицах хранения (int64), после чего стоимость в любой базовой валюте —
+    это произведение матрицы на вектор курсов за единицу хранения. Итоги
+    округляются до единиц базовой валюты.
+    """
+
+    def __init__(self, rates: RateService | None = None) -> None:
+        self.db = DatabaseManager()
+        self.rates = rates or RateService()
+
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.codes: list[str] = []
+        self._ids = np.empty(0, dtype=np.intp)
+        self.units = np.empty((0, 0), dtype=np.int64)
+        self._units_f = np.empty((0, 0), dtype=np.float64)
+        self._scales = np.empty(0, dtype=np.float64)
+
+    def load(self) -> None:
+        user_ids = []
+        columns: dict[str, int] = {}
+        cells: list[tuple[int, int, int]] = []
+
+        for row, p in enumerate(self.db.iter_portfolios()):
+            user_ids.append(p["user_id"])
+            for code, data in p.get("wallets", {}).items():
+                col = columns.setdefault(code, len(columns))
+                cells.append((row, col, wallet_units(data, code)))
+
+        units = np.zeros((len(user_ids), len(columns)), dtype=np.int64)
+        if cells:
+            rows, cols, values = zip(*cells)
+            units[list(rows), list(cols)] = values
+
+        self.set_units(np.array(user_ids, dtype=np.int64), list(columns), units)
+
+    def set_units(self, user_ids: np.ndarray, codes: list[str], units: np.ndarray) -> None:
+        self.user_ids = user_ids
+        self.codes = codes
+        self._ids = np.array([currency_id(code) for code in codes], dtype=np.intp)
+        self.units = units
+        # точная копия для BLAS: целые до 2**53 представимы в float64 без потерь
+        self._units_f = units.astype(np.float64)
+        # не зависят от курсов — считаются один раз на загрузку, а не на каждую переоценку
+        self._held = (units != 0).any(axis=0)
+        self._column_units = [int(u) for u in units.sum(axis=0, dtype=object)] if codes else []
+        self._scales = np.array([10 ** get_currency(code).decimals for code in codes], dtype=np.float64)
+
+    def rate_vector(self, base_code: str) -> np.ndarray:
+        """Курсы валют self.codes в базовой валюте за целую единицу (nan, если курса нет)."""
+        matrix = self.rates.get_matrix()
+        table = np.frombuffer(matrix.rates, dtype=np.float64).reshape(matrix.size, matrix.size)
+        vector = table[self._ids, currency_id(base_code)]
+
+        # валюта в самой себе — 1, даже если её нет в снимке курсов
+        vector[self._ids == currency_id(base_code)] = 1.0
+        return vector
+
+    def revalue(self, base_currency: str = "USD") -> dict:
+        base = get_currency(base_currency)
+        vector = self.rate_vector(base.code)
+
+        missing = np.isnan(vector) & self._held
+        if missing.any():
+            code = self.codes[int(np.argmax(missing))]
+            raise ApiRequestError(f"Курс {code}_{base.code} недоступен")
+
+        # курс за единицу хранения валюты в единицах хранения базовой валюты
+        base_scale = 10 ** base.decimals
+        per_unit = np.nan_to_num(vector) * base_scale / self._scales
+
+        totals = np.rint(self._units_f @ per_unit).astype(np.int64)
+
+        return {
+            "base": base.code,
+            "scale": base_scale,
+            "user_ids": self.user_ids,
+            "totals": totals,
+            "exposure": {
+                code: from_units(round(units * rate), base.code)
+                for code, units, rate in zip(self.codes, self._column_units, per_unit.tolist())
+            },
+        }
+
+
+class BulkPnL(BulkValuation):
+    """P&L всех пользователей для отчётов на конец дня.
+
+    Матрица единиц — учтённые (с себестоимостью) части балансов, поэтому
+    revalue() даёт их текущую стоимость одной матричной операцией. Из неё
+    вычитается себестоимость открытых позиций, сложенная по пользователю
+    при загрузке; себестоимость в другой валюте, чем базовая валюта отчёта,
+    пересчитывается по текущему курсу.
+    """
+
+    def __init__(self, rates: RateService | None = None) -> None:
+        super().__init__(rates)
+        self.cost_bases: list[str | None] = []
+        self.cost: list[int] = []
+        self.realized: list[int] = []
+
+    def load(self) -> None:
+        user_ids = []
+        columns: dict[str, int] = {}
+        cells: list[tuple[int, int, int]] = []
+        self.cost_bases, self.cost, self.realized = [], [], []
+
+        for row, p in enumerate(self.db.iter_portfolios()):
+            user_ids.append(p["user_id"])
+            cost = realized = 0
+            for code, data in p.get("wallets", {}).items():
+                basis = data.get("basis")
+                if basis is None:
+                    continue
+                col = columns.setdefault(code, len(columns))
+                cells.append((row, col, int(basis["units"])))
+                cost += int(basis["cost"])
+                realized += int(basis["realized"])
+            self.cost_bases.append(p.get("cost_base"))
+            self.cost.append(cost)
+            self.realized.append(realized)
+
+        units = np.zeros((len(user_ids), len(columns)), dtype=np.int64)
+        if cells:
+            rows, cols, values = zip(*cells)
+            units[list(rows), list(cols)] = values
+
+        self.set_units(np.array(user_ids, dtype=np.int64), list(columns), units)
+
+    def _to_base(self, amounts: list[int], base: str) -> np.ndarray:
+        """Суммы в валютах себестоимости пользователей -> единицы base (int64)."""
+        result = np.array(amounts, dtype=np.int64)
+        matrix = self.rates.get_matrix()
+        for code in set(self.cost_bases) - {None, base}:
+            found = matrix.get(code, base)
+            if found is None:
+                raise ApiRequestError(f"Курс {code}_{base} недоступен")
+            rows = [i for i, c in enumerate(self.cost_bases) if c == code]
+            result[rows] = [convert_units(amounts[i], code, found[0], base) for i in rows]
+        return result
+
+    def report(self, base_currency: str = "USD") -> dict:
+        base = get_currency(base_currency)
+        value = self.revalue(base.code)["totals"]
+        cost = self._to_base(self.cost, base.code)
+        realized = self._to_base(self.realized, base.code)
+
+        return {
+            "base": base.code,
+            "scale": 10 ** base.decimals,
+            "user_ids": self.user_ids,
+            "value": value,
+            "cost": cost,
+            "unrealized": value - cost,
+            "realized": realized,
+        }
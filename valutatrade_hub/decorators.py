@@ -3,6 +3,13 @@ from functools import wraps
 from datetime import datetime
 
 
+def _details(result) -> str:
+    """Поля результата для строки лога: user_id=1 currency=BTC amount=0.1 ..."""
+    if not isinstance(result, dict):
+        return ""
+    return " " + " ".join(f"{k}={v}" for k, v in result.items() if k != "timestamp")
+
+
 def log_action(action: str):
     def decorator(func):
         @wraps(func)
@@ -12,12 +19,15 @@ def log_action(action: str):
 
             try:
                 result = func(*args, **kwargs)
-                logger.info(f"Действие {action} совершено успешно! - {timestamp}")
+                logger.info(f"Действие {action} совершено успешно!{_details(result)} - {timestamp}")
                 return result
             except Exception as e:
-                logger.error(f"Ошибка при выполнении действия {action} - {timestamp}: {str(e)}")
+                # аргументы без self и объектов пользователя: валюта и сумма
+                params = ", ".join(repr(a) for a in args[1:] if isinstance(a, (str, int, float)))
+                logger.error(
+                    f"Ошибка при выполнении действия {action}({params}) - {timestamp}: {str(e)}"
+                )
                 raise
 
         return wrapper
     return decorator
-
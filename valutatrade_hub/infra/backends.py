@@ -0,0 +1,699 @@
+import contextlib
+import copy
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Iterator
+
+from valutatrade_hub.core.exceptions import ConcurrentUpdateError
+from valutatrade_hub.core.models import Portfolio
+from valutatrade_hub.infra.indexes import ListIndex
+from valutatrade_hub.infra.locking import FileLock
+from valutatrade_hub.infra.journal import TradeJournal, read_records
+
+
+SQLITE_FILENAME = "valutatrade.db"
+SHARDS_DIR = "portfolios"
+LAYOUT_FILENAME = "layout.json"
+LOCK_SHARDS = 64
+
+
+class StorageBackend(ABC):
+    """Хранилище пользователей и портфелей с доступом по ключу."""
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> dict | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> dict | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def next_user_id(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_user(self, user: dict) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_user(self, user: dict) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_portfolio(self, user_id: int) -> dict | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_portfolio(self, portfolio: dict) -> None:
+        raise NotImplementedError
+
+    def load_portfolio(self, user_id: int) -> Portfolio | None:
+        """Портфель в виде модели; бэкенды могут строить её без промежуточной копии записи."""
+        record = self.get_portfolio(user_id)
+        return Portfolio.from_record(record) if record is not None else None
+
+    @abstractmethod
+    def iter_portfolios(self) -> Iterator[dict]:
+        raise NotImplementedError
+
+    def write_locks(self) -> list[str]:
+        """Блокировки, которые transaction() берёт на время пакета."""
+        return ["portfolios"]
+
+    def begin(self) -> None:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class PortfolioShard:
+    """Один файл портфелей вместе с его журналом, индексом и блокировкой.
+
+    Если передан журнал, изменения портфелей дописываются в него одной
+    строкой, а сам файл переписывается только при компактизации.
+    Дописывание в журнал идёт под разделяемой блокировкой шарда и
+    блокировкой группы пользователей, переписывание файла — под исключительной.
+    """
+
+    def __init__(
+        self,
+        db,
+        filename: str,
+        lock_name: str,
+        journal: TradeJournal | None = None,
+        compact_every: int = 1000,
+    ) -> None:
+        self.db = db
+        self.filename = filename
+        self.lock_name = lock_name
+        self.journal = journal
+        self.compact_every = max(1, int(compact_every))
+
+        self._overlay: dict[int, dict] = {}
+        self._journal_offset = 0
+        self._journal_records = 0
+        self._snapshot_sig = None
+
+        self.index = ListIndex(db, filename, ("user_id",))
+
+    def ensure_file(self) -> None:
+        path = self.db._get_path(self.filename)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self.db.locked(self.lock_name):
+            if not path.exists():
+                self.db.write(self.filename, [])
+
+    def get(self, user_id: int) -> dict | None:
+        self._sync_overlay()
+        if user_id in self._overlay:
+            return self._overlay[user_id]
+        return self.index.lookup("user_id", user_id)
+
+    def save(self, portfolio: dict, check_version) -> None:
+        user_id = portfolio["user_id"]
+
+        if self.journal is None:
+            with self.db.locked(self.lock_name):
+                check_version(portfolio)
+                self._write_snapshot({user_id: portfolio})
+            return
+
+        with (
+            self.db.locked(self.lock_name, shared=True),
+            self.db.locked(f"{self.lock_name}.{user_id % LOCK_SHARDS}"),
+        ):
+            self._sync_overlay()
+            check_version(portfolio)
+            self.journal.append(portfolio)
+            self._overlay[user_id] = portfolio
+            self._journal_records += 1
+
+        if self._journal_records >= self.compact_every:
+            self.compact()
+
+    def save_many(self, portfolios: list[dict]) -> None:
+        """Запись портфелей транзакции (блокировки уже взяты в transaction())."""
+        if self.journal is None:
+            self._write_snapshot({p["user_id"]: p for p in portfolios})
+            return
+
+        self._sync_overlay()
+        for portfolio in portfolios:
+            self.journal.append(portfolio)
+            self._overlay[portfolio["user_id"]] = portfolio
+        self._journal_records += len(portfolios)
+        self.journal.sync()
+
+        if self._journal_records >= self.compact_every:
+            self.compact()
+
+    def iter(self) -> Iterator[dict]:
+        self._sync_overlay()
+        overlay = dict(self._overlay)
+        seen = set()
+        for p in self.db.read(self.filename):
+            seen.add(p["user_id"])
+            yield overlay.get(p["user_id"], p)
+        for user_id, p in overlay.items():
+            if user_id not in seen:
+                yield p
+
+    def compact(self) -> None:
+        """Переносит журнал в файл шарда и очищает его."""
+        if self.journal is None:
+            return
+
+        with self.db.locked(self.lock_name):
+            self.journal.sync()
+            self._sync_overlay()
+            if self._overlay:
+                self._write_snapshot(self._overlay)
+
+            self.journal.truncate()
+            self._overlay = {}
+            self._journal_offset = 0
+            self._journal_records = 0
+            self._snapshot_sig = self._stat_snapshot()
+
+    def close(self) -> None:
+        if self.journal is not None:
+            self.compact()
+            self.journal.close()
+            self.journal = None
+
+    def _write_snapshot(self, changes: dict[int, dict]) -> None:
+        portfolios = list(self.index.records())
+        positions = []
+        for user_id, p in changes.items():
+            position = self.index.position("user_id", user_id)
+            if position is None:
+                position = len(portfolios)
+                portfolios.append(p)
+            else:
+                portfolios[position] = p
+            positions.append(position)
+
+        self.db.write(self.filename, portfolios)
+        self.index.written(portfolios, positions)
+
+    def _stat_snapshot(self):
+        try:
+            st = os.stat(self.db._get_path(self.filename))
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _sync_overlay(self) -> None:
+        """Догоняет журнал, включая записи других процессов."""
+        if self.journal is None:
+            return
+
+        sig = self._stat_snapshot()
+        if sig != self._snapshot_sig:
+            # snapshot переписан (компактизация) — перечитываем журнал с начала
+            self._snapshot_sig = sig
+            self._overlay = {}
+            self._journal_offset = 0
+            self._journal_records = 0
+
+        try:
+            size = os.path.getsize(self.journal.path)
+        except FileNotFoundError:
+            return
+        if size < self._journal_offset:
+            self._overlay = {}
+            self._journal_offset = 0
+            self._journal_records = 0
+        if size == self._journal_offset:
+            return
+
+        records, self._journal_offset = self.journal.read_from(self._journal_offset)
+        for r in records:
+            self._overlay[r["user_id"]] = r
+        self._journal_records += len(records)
+
+
+def shard_layout(shards: int) -> list[tuple[str, str]]:
+    """(файл, имя блокировки) каждого шарда; шард пользователя — user_id % shards."""
+    if shards <= 1:
+        return [("portfolios.json", "portfolios")]
+    return [
+        (f"{SHARDS_DIR}/shard_{k}.json", f"portfolios_{k}")
+        for k in range(shards)
+    ]
+
+
+def read_shard_count(data_dir: Path) -> int:
+    """Число шардов, в которых сейчас лежат портфели (по portfolios/layout.json)."""
+    try:
+        with (Path(data_dir) / SHARDS_DIR / LAYOUT_FILENAME).open("r", encoding="utf-8") as f:
+            return int(json.load(f)["shards"])
+    except FileNotFoundError:
+        return 1
+
+
+class JsonBackend(StorageBackend):
+    """Исходный формат: users.json и портфели в JSON-файлах.
+
+    При shards = 1 все портфели лежат в portfolios.json, иначе портфель
+    пользователя хранится в portfolios/shard_<user_id % shards>.json, и
+    сделки разных шардов не мешают друг другу. Поиск по username и user_id
+    идёт через хеш-индексы в памяти (ListIndex).
+
+    Запись портфеля проверяет его version: если с момента чтения портфель
+    изменил другой процесс, выбрасывается ConcurrentUpdateError.
+    """
+
+    def __init__(
+        self,
+        db,
+        shards: int = 1,
+        journal_factory: Callable[[Path], TradeJournal] | None = None,
+        compact_every: int = 1000,
+    ) -> None:
+        self.db = db
+        self._batch: dict[int, dict] | None = None
+        self._users_dirty = False
+
+        self.users_index = ListIndex(db, "users.json", ("username", "user_id"), max_field="user_id")
+
+        shards = max(1, int(shards))
+        data_dir = Path(db._settings.get("DATA_DIR"))
+        stored = read_shard_count(data_dir)
+        if stored != shards and stored == 1 and not (data_dir / "portfolios.json").exists():
+            # портфелей ещё нет — сразу создаём раскладку из настроек
+            _write_json(data_dir / SHARDS_DIR / LAYOUT_FILENAME, {"shards": shards})
+            stored = shards
+        if stored != shards:
+            raise ValueError(
+                f"Портфели разбиты на {stored} шард(ов), а в настройках portfolio_shards = {shards}. "
+                f"Выполните: python -m valutatrade_hub.infra.migrate reshard --shards {shards}"
+            )
+
+        self.shards = []
+        for filename, lock_name in shard_layout(shards):
+            journal = None
+            if journal_factory is not None:
+                path = db._get_path(filename)
+                journal = journal_factory(path.with_suffix(".journal"))
+            shard = PortfolioShard(db, filename, lock_name, journal, compact_every)
+            shard.ensure_file()
+            self.shards.append(shard)
+
+    def shard_for(self, user_id: int) -> PortfolioShard:
+        return self.shards[user_id % len(self.shards)]
+
+    def write_locks(self) -> list[str]:
+        return [shard.lock_name for shard in self.shards]
+
+    def get_user_by_username(self, username: str) -> dict | None:
+        return self.users_index.lookup("username", username)
+
+    def get_user(self, user_id: int) -> dict | None:
+        return self.users_index.lookup("user_id", user_id)
+
+    def next_user_id(self) -> int:
+        self.users_index.records()
+        return self.users_index.max_value + 1
+
+    def add_user(self, user: dict) -> None:
+        users = self.users_index.records() + [user]
+        self.db.write("users.json", users)
+        self.users_index.written(users, [len(users) - 1])
+        self._users_dirty = True
+
+    def update_user(self, user: dict) -> None:
+        users = list(self.users_index.records())
+        position = self.users_index.position("user_id", user["user_id"])
+        if position is None:
+            raise ValueError(f"Пользователь с id={user['user_id']} не найден")
+        users[position] = user
+        self.db.write("users.json", users)
+        self.users_index.written(users, [position])
+        self._users_dirty = True
+
+    def _record(self, user_id: int) -> dict | None:
+        """Запись портфеля без копирования — только для чтения."""
+        if self._batch is not None and user_id in self._batch:
+            return self._batch[user_id]
+        return self.shard_for(user_id).get(user_id)
+
+    def get_portfolio(self, user_id: int) -> dict | None:
+        p = self._record(user_id)
+        return copy.deepcopy(p) if p is not None else None
+
+    def load_portfolio(self, user_id: int) -> Portfolio | None:
+        # Portfolio.from_record только читает запись, поэтому deepcopy не нужен
+        p = self._record(user_id)
+        return Portfolio.from_record(p) if p is not None else None
+
+    def _check_version(self, portfolio: dict) -> None:
+        user_id = portfolio["user_id"]
+        expected = portfolio.get("version", 0)
+
+        if self._batch is not None and user_id in self._batch:
+            current = self._batch[user_id]
+        else:
+            current = self.shard_for(user_id).get(user_id)
+
+        if current is not None and current.get("version", 0) != expected:
+            raise ConcurrentUpdateError(user_id)
+        portfolio["version"] = expected + 1
+
+    def save_portfolio(self, portfolio: dict) -> None:
+        if self._batch is not None:
+            self._check_version(portfolio)
+            self._batch[portfolio["user_id"]] = portfolio
+            return
+
+        self.shard_for(portfolio["user_id"]).save(portfolio, self._check_version)
+
+    def iter_portfolios(self) -> Iterator[dict]:
+        batch = dict(self._batch or {})
+        seen = set()
+        for shard in self.shards:
+            for p in shard.iter():
+                seen.add(p["user_id"])
+                yield batch.get(p["user_id"], p)
+        for user_id, p in batch.items():
+            if user_id not in seen:
+                yield p
+
+    def begin(self) -> None:
+        self._batch = {}
+        self._users_dirty = False
+
+    def commit(self) -> None:
+        batch, self._batch = self._batch or {}, None
+
+        if self._users_dirty:
+            self.users_index.flush()
+            self._users_dirty = False
+
+        by_shard: dict[int, list[dict]] = {}
+        for user_id, portfolio in batch.items():
+            by_shard.setdefault(user_id % len(self.shards), []).append(portfolio)
+        for k, portfolios in by_shard.items():
+            self.shards[k].save_many(portfolios)
+
+    def rollback(self) -> None:
+        self._batch = None
+        if self._users_dirty:
+            self.users_index.rebuild(self.db.read("users.json"))
+            self._users_dirty = False
+
+    def compact(self) -> None:
+        """Переносит журналы всех шардов в их файлы."""
+        for shard in self.shards:
+            shard.compact()
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+
+
+class SqliteBackend(StorageBackend):
+    """SQLite: одна строка на пользователя и одна на портфель."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            hashed_password TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            registration_date TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS portfolios (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+
+    _USER_COLUMNS = ("user_id", "username", "hashed_password", "salt", "registration_date")
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._in_batch = False
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+
+    def _tx(self):
+        """Внутри begin()/commit() отдельные операции не фиксируются."""
+        return contextlib.nullcontext() if self._in_batch else self._conn
+
+    def begin(self) -> None:
+        self._in_batch = True
+
+    def commit(self) -> None:
+        with self._lock:
+            self._in_batch = False
+            self._conn.commit()
+
+    def rollback(self) -> None:
+        with self._lock:
+            self._in_batch = False
+            self._conn.rollback()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _user_from_row(self, row) -> dict | None:
+        if row is None:
+            return None
+        return dict(zip(self._USER_COLUMNS, row))
+
+    def get_user_by_username(self, username: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, username, hashed_password, salt, registration_date "
+                "FROM users WHERE username = ?",
+                (username,),
+            ).fetchone()
+        return self._user_from_row(row)
+
+    def get_user(self, user_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, username, hashed_password, salt, registration_date "
+                "FROM users WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        return self._user_from_row(row)
+
+    def next_user_id(self) -> int:
+        with self._lock:
+            (max_id,) = self._conn.execute("SELECT MAX(user_id) FROM users").fetchone()
+        return (max_id or 0) + 1
+
+    def add_user(self, user: dict) -> None:
+        with self._lock, self._tx():
+            self._conn.execute(
+                "INSERT INTO users VALUES (?, ?, ?, ?, ?)",
+                tuple(user[c] for c in self._USER_COLUMNS),
+            )
+
+    def update_user(self, user: dict) -> None:
+        with self._lock, self._tx():
+            self._conn.execute(
+                "UPDATE users SET username = ?, hashed_password = ?, salt = ?, "
+                "registration_date = ? WHERE user_id = ?",
+                tuple(user[c] for c in self._USER_COLUMNS[1:]) + (user["user_id"],),
+            )
+
+    def add_users(self, users: list[dict]) -> None:
+        with self._lock, self._tx():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)",
+                [tuple(u[c] for c in self._USER_COLUMNS) for u in users],
+            )
+
+    def get_portfolio(self, user_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM portfolios WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        portfolio = json.loads(row[0])
+        portfolio["user_id"] = user_id
+        return portfolio
+
+    def save_portfolio(self, portfolio: dict) -> None:
+        user_id = portfolio["user_id"]
+        expected = portfolio.get("version", 0)
+        data = {k: v for k, v in portfolio.items() if k != "user_id"}
+        data["version"] = expected + 1
+        payload = json.dumps(data, ensure_ascii=False)
+
+        with self._lock, self._tx():
+            cursor = self._conn.execute(
+                "UPDATE portfolios SET data = ? WHERE user_id = ? "
+                "AND COALESCE(json_extract(data, '$.version'), 0) = ?",
+                (payload, user_id, expected),
+            )
+            if cursor.rowcount == 0:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM portfolios WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if exists:
+                    raise ConcurrentUpdateError(user_id)
+                self._conn.execute(
+                    "INSERT INTO portfolios (user_id, data) VALUES (?, ?)", (user_id, payload)
+                )
+
+        portfolio["version"] = expected + 1
+
+    def save_portfolios(self, portfolios: list[dict]) -> None:
+        rows = []
+        for p in portfolios:
+            data = {k: v for k, v in p.items() if k != "user_id"}
+            rows.append((p["user_id"], json.dumps(data, ensure_ascii=False)))
+        with self._lock, self._tx():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO portfolios (user_id, data) VALUES (?, ?)", rows
+            )
+
+    def iter_portfolios(self) -> Iterator[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, data FROM portfolios ORDER BY user_id"
+            ).fetchall()
+        for user_id, data in rows:
+            portfolio = json.loads(data)
+            portfolio["user_id"] = user_id
+            yield portfolio
+
+
+def create_backend(name: str, db) -> StorageBackend:
+    data_dir: Path = db._settings.get("DATA_DIR")
+
+    if name == "json":
+        journal_factory = None
+        if db._settings.get("JOURNAL_ENABLED", True):
+            def journal_factory(path: Path) -> TradeJournal:
+                return TradeJournal(
+                    path,
+                    group_size=db._settings.get("JOURNAL_GROUP_SIZE", 32),
+                    flush_interval=db._settings.get("JOURNAL_FLUSH_INTERVAL_MS", 50) / 1000,
+                )
+        return JsonBackend(
+            db,
+            shards=db._settings.get("PORTFOLIO_SHARDS", 1),
+            journal_factory=journal_factory,
+            compact_every=db._settings.get("JOURNAL_COMPACT_EVERY", 1000),
+        )
+    if name == "sqlite":
+        return SqliteBackend(data_dir / SQLITE_FILENAME)
+
+    raise ValueError(f"Неизвестный тип хранилища '{name}'")
+
+
+def load_json_portfolios(data_dir: Path) -> list[dict]:
+    """Все портфели JSON-хранилища с учётом ещё не компактизированных журналов."""
+    data_dir = Path(data_dir)
+    portfolios: dict[int, dict] = {}
+
+    for filename, _ in shard_layout(read_shard_count(data_dir)):
+        path = data_dir / filename
+        with path.open("r", encoding="utf-8") as f:
+            for p in json.load(f):
+                portfolios[p["user_id"]] = p
+        journal_path = path.with_suffix(".journal")
+        if journal_path.exists():
+            records, _ = read_records(journal_path)
+            for p in records:
+                portfolios[p["user_id"]] = p
+
+    return [portfolios[user_id] for user_id in sorted(portfolios)]
+
+
+def _write_json(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def reshard_portfolios(data_dir: Path, shards: int) -> dict:
+    """Перекладывает портфели JSON-хранилища в shards файлов.
+
+    Выполняется под исключительными блокировками всех текущих шардов;
+    журналы при этом переносятся в новые файлы и удаляются.
+    """
+    data_dir = Path(data_dir)
+    shards = max(1, int(shards))
+    old_layout = shard_layout(read_shard_count(data_dir))
+    new_layout = shard_layout(shards)
+
+    with contextlib.ExitStack() as locks:
+        for _, lock_name in old_layout:
+            locks.enter_context(FileLock(data_dir / "locks" / f"{lock_name}.lock"))
+
+        portfolios = load_json_portfolios(data_dir)
+
+        buckets: list[list[dict]] = [[] for _ in new_layout]
+        for p in portfolios:
+            buckets[p["user_id"] % shards].append(p)
+
+        for (filename, _), bucket in zip(new_layout, buckets):
+            _write_json(data_dir / filename, bucket)
+
+        layout_path = data_dir / SHARDS_DIR / LAYOUT_FILENAME
+        if shards > 1:
+            _write_json(layout_path, {"shards": shards})
+        else:
+            layout_path.unlink(missing_ok=True)
+
+        new_files = {filename for filename, _ in new_layout}
+        for filename, _ in old_layout:
+            path = data_dir / filename
+            path.with_suffix(".journal").unlink(missing_ok=True)
+            if filename not in new_files:
+                path.unlink(missing_ok=True)
+
+        shards_dir = data_dir / SHARDS_DIR
+        if shards == 1 and shards_dir.is_dir() and not any(shards_dir.iterdir()):
+            shards_dir.rmdir()
+
+    return {
+        "from": len(old_layout),
+        "to": shards,
+        "portfolios": len(portfolios),
+    }
+
+
+def migrate_json_to_sqlite(data_dir: Path) -> dict:
+    """Однократный перенос users.json и портфелей JSON-хранилища в SQLite."""
+    data_dir = Path(data_dir)
+
+    with (data_dir / "users.json").open("r", encoding="utf-8") as f:
+        users = json.load(f)
+    portfolios = load_json_portfolios(data_dir)
+
+    backend = SqliteBackend(data_dir / SQLITE_FILENAME)
+    backend.add_users(users)
+    backend.save_portfolios(portfolios)
+
+    return {"users": len(users), "portfolios": len(portfolios)}
@@ -1,7 +1,12 @@
 import json
+import os
+from contextlib import ExitStack, contextmanager, nullcontext
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
+from valutatrade_hub.core.models import Portfolio
+from valutatrade_hub.infra.backends import StorageBackend, create_backend
+from valutatrade_hub.infra.locking import FileLock
 from valutatrade_hub.infra.settings import SettingsLoader
 
 
@@ -12,20 +17,184 @@ class DatabaseManager:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._settings = SettingsLoader()
+            cls._instance._backend = None
+            cls._instance._cache = {}
+            cls._instance._cache_hits = 0
+            cls._instance._cache_misses = 0
+            cls._instance._pending = None
+            cls._instance._after_commit = []
+            cls._instance._transactions = 0
+            cls._instance._holding_locks = False
         return cls._instance
 
     def _get_path(self, filename: str) -> Path:
         data_dir: Path = self._settings.get("DATA_DIR")
         return data_dir / filename
 
+    @property
+    def backend(self) -> StorageBackend:
+        if self._backend is None:
+            name = self._settings.get("STORAGE_BACKEND", "json")
+            self._backend = create_backend(name, self)
+        return self._backend
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> tuple[int, int, int]:
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
     def read(self, filename: str) -> Any:
+        """Читает JSON-документ; разобранный документ кешируется до изменения файла.
+
+        Возвращаемый объект общий для всех вызовов — изменять его можно только
+        перед последующей записью через write().
+        """
         path = self._get_path(filename)
-        if not path.exists():
+        if self._pending is not None and path in self._pending:
+            self._cache_hits += 1
+            return self._pending[path]
+
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._cache.pop(path, None)
             raise FileNotFoundError(f"Файл {filename} не найден")
+
+        sig = self._signature(st)
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == sig:
+            self._cache_hits += 1
+            return cached[1]
+
+        self._cache_misses += 1
         with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
+            data = json.load(f)
+        self._cache[path] = (sig, data)
+        return data
 
     def write(self, filename: str, data: Any) -> None:
         path = self._get_path(filename)
-        with path.open("w", encoding="utf-8") as f:
+        if self._pending is not None:
+            self._pending[path] = data
+            return
+        self._write_file(path, data)
+
+    def _write_file(self, path: Path, data: Any) -> None:
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._cache[path] = (self._signature(os.stat(path)), data)
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._pending is not None
+
+    @property
+    def transaction_id(self) -> int | None:
+        """Номер текущей transaction() (None вне её): данные, отложенные до commit, привязываются к нему."""
+        return self._transactions if self._pending is not None else None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Группа операций с одной записью на диск в конце.
+
+        Документы и портфели, изменённые внутри блока, держатся в памяти и
+        записываются один раз при выходе; при исключении изменения отбрасываются.
+        """
+        if self._pending is not None:
+            yield
+            return
+
+        with ExitStack() as locks:
+            # вся транзакция выполняется под исключительными блокировками,
+            # поэтому вложенные locked() внутри неё ничего не делают
+            locks.enter_context(self.locked("users"))
+            for name in self.backend.write_locks():
+                locks.enter_context(self.locked(name))
+            self._holding_locks = True
+            locks.callback(setattr, self, "_holding_locks", False)
+
+            self._pending = {}
+            self._after_commit = []
+            self._transactions += 1
+            self.backend.begin()
+            try:
+                yield
+            except BaseException:
+                self._pending = None
+                self._after_commit = []
+                self.backend.rollback()
+                raise
+
+            pending, self._pending = self._pending, None
+            for path, data in pending.items():
+                self._write_file(path, data)
+            self.backend.commit()
+
+            callbacks, self._after_commit = self._after_commit, []
+            for callback in callbacks:
+                callback()
+
+    def after_commit(self, callback) -> None:
+        """Вызывает callback сразу, а внутри transaction() — после успешной записи."""
+        if self._pending is None:
+            callback()
+        else:
+            self._after_commit.append(callback)
+
+    def locked(self, name: str, shared: bool = False):
+        """Межпроцессная блокировка DATA_DIR/locks/<name>.lock (внутри transaction() — пустая)."""
+        if self._holding_locks:
+            return nullcontext()
+        return FileLock(self._get_path("locks") / f"{name}.lock", shared=shared)
+
+    def invalidate(self, filename: str | None = None) -> None:
+        if filename is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(self._get_path(filename), None)
+
+    def cache_stats(self) -> dict:
+        return {
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "entries": len(self._cache),
+        }
+
+    def close(self) -> None:
+        if self._pending is not None:
+            raise RuntimeError("Нельзя закрыть хранилище внутри незавершённой транзакции")
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+
+    # users / portfolios
+
+    def get_user_by_username(self, username: str) -> dict | None:
+        return self.backend.get_user_by_username(username)
+
+    def get_user(self, user_id: int) -> dict | None:
+        return self.backend.get_user(user_id)
+
+    def next_user_id(self) -> int:
+        return self.backend.next_user_id()
+
+    def add_user(self, user: dict) -> None:
+        self.backend.add_user(user)
+
+    def update_user(self, user: dict) -> None:
+        self.backend.update_user(user)
+
+    def get_portfolio(self, user_id: int) -> dict | None:
+        return self.backend.get_portfolio(user_id)
+
+    def load_portfolio(self, user_id: int) -> Portfolio | None:
+        return self.backend.load_portfolio(user_id)
+
+    def save_portfolio(self, portfolio: dict) -> None:
+        self.backend.save_portfolio(portfolio)
+
+    def iter_portfolios(self) -> Iterator[dict]:
+        return self.backend.iter_portfolios()
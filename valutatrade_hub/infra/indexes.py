@@ -0,0 +1,74 @@
+import os
+
+
+class ListIndex:
+    """Хеш-индекс JSON-списка в памяти: значение поля -> позиция записи.
+
+    Индекс привязан к сигнатуре документа (inode, mtime_ns, size). Если
+    документ изменили в обход индекса (другой процесс), сигнатура не совпадёт
+    и индекс перестроится одним проходом по уже разобранному документу.
+    """
+
+    def __init__(self, db, filename: str, fields: tuple[str, ...], max_field: str | None = None):
+        self.db = db
+        self.filename = filename
+        self.fields = fields
+        self.max_field = max_field
+
+        self._sig: list | None = None
+        self._maps: dict[str, dict[str, int]] = {f: {} for f in fields}
+        self.max_value = 0
+
+    def _document_sig(self) -> list | None:
+        try:
+            st = os.stat(self.db._get_path(self.filename))
+        except FileNotFoundError:
+            return None
+        return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+    def _index_record(self, record: dict, position: int) -> None:
+        for field in self.fields:
+            self._maps[field][str(record[field])] = position
+        if self.max_field is not None:
+            self.max_value = max(self.max_value, int(record[self.max_field]))
+
+    def rebuild(self, records: list, sig: list | None = None) -> None:
+        self._maps = {f: {} for f in self.fields}
+        self.max_value = 0
+        for position, record in enumerate(records):
+            self._index_record(record, position)
+        self._sig = self._document_sig() if sig is None else sig
+
+    def records(self) -> list:
+        """Документ, для которого индекс гарантированно актуален."""
+        # файл могут заменить между stat и чтением: сигнатура должна совпасть до и после
+        while True:
+            sig = self._document_sig()
+            records = self.db.read(self.filename)
+            if self._document_sig() == sig:
+                break
+        if sig != self._sig:
+            self.rebuild(records, sig)
+        return records
+
+    def position(self, field: str, value) -> int | None:
+        self.records()
+        return self._maps[field].get(str(value))
+
+    def lookup(self, field: str, value) -> dict | None:
+        records = self.records()
+        position = self._maps[field].get(str(value))
+        if position is None:
+            return None
+        return records[position]
+
+    def written(self, records: list, positions) -> None:
+        """Обновляет индекс после записи документа: positions — изменённые/новые записи."""
+        for position in positions:
+            self._index_record(records[position], position)
+        if not self.db.in_transaction:
+            self.flush()
+
+    def flush(self) -> None:
+        """Привязывает индекс к текущей версии документа на диске."""
+        self._sig = self._document_sig()
@@ -0,0 +1,124 @@
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+class GroupSync:
+    """Групповой fsync файла дозаписи.
+
+    fsync выполняется после group_size записей или если с прошлого fsync
+    прошло больше flush_interval секунд. Если группа не набралась, её
+    дописывает на диск таймер, поэтому запись не остаётся без fsync дольше
+    flush_interval и при простое. Запись в файл и вызов written() делаются
+    под self.lock.
+    """
+
+    def __init__(self, fsync: Callable[[], None], group_size: int = 32, flush_interval: float = 0.05):
+        self._fsync = fsync
+        self.group_size = max(1, int(group_size))
+        self.flush_interval = float(flush_interval)
+
+        self.lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer: threading.Timer | None = None
+
+    def written(self) -> None:
+        """Отмечает дописанную запись (под self.lock)."""
+        self._pending += 1
+
+        now = time.monotonic()
+        if self._pending >= self.group_size or now - self._last_sync >= self.flush_interval:
+            self._sync_locked(now)
+        elif self._timer is None:
+            delay = self.flush_interval - (now - self._last_sync)
+            self._timer = threading.Timer(delay, self.sync)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def sync(self) -> None:
+        with self.lock:
+            if self._pending:
+                self._sync_locked(time.monotonic())
+
+    def discard(self) -> None:
+        """Забывает несинхронизированные записи (файл усечён, под self.lock)."""
+        self._pending = 0
+        self._cancel_timer()
+
+    def _sync_locked(self, now: float) -> None:
+        self._fsync()
+        self._pending = 0
+        self._last_sync = now
+        self._cancel_timer()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class TradeJournal:
+    """Журнал изменений портфелей: одна JSON-строка на запись.
+
+    Строки пишутся сразу, а fsync выполняется группами (GroupSync).
+    """
+
+    def __init__(self, path: Path, group_size: int = 32, flush_interval: float = 0.05):
+        self.path = Path(path)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._group = GroupSync(lambda: os.fsync(self._file.fileno()), group_size, flush_interval)
+
+        atexit.register(self.sync)
+
+    def append(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._group.lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._group.written()
+
+    def sync(self) -> None:
+        self._group.sync()
+
+    def read_from(self, offset: int) -> tuple[list[dict], int]:
+        """Записи, начиная с байтового смещения, и смещение после последней целой строки."""
+        return read_records(self.path, offset)
+
+    def replay(self) -> Iterator[dict]:
+        records, _ = self.read_from(0)
+        yield from records
+
+    def truncate(self) -> None:
+        with self._group.lock:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._group.discard()
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+        atexit.unregister(self.sync)
+
+
+def read_records(path: Path, offset: int = 0) -> tuple[list[dict], int]:
+    """Целые записи журнала начиная со смещения (недописанный хвост пропускается)."""
+    records = []
+    with Path(path).open("rb") as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(raw))
+            except json.JSONDecodeError:
+                break
+            offset += len(raw)
+    return records, offset
@@ -0,0 +1,132 @@
+import atexit
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+
+from valutatrade_hub.infra.journal import GroupSync
+from valutatrade_hub.infra.locking import FileLock
+
+
+# слот пользователя в heads.idx: смещение его последней сделки + 1 (0 — сделок нет)
+HEAD = struct.Struct("<Q")
+
+
+class TradeLedger:
+    """Журнал исполненных сделок только на дозапись.
+
+    trades.jsonl — одна JSON-строка на сделку. Каждая запись хранит смещение
+    предыдущей сделки того же пользователя (prev), а heads.idx — массив
+    смещений последних сделок, индексированный по user_id. Поэтому последние
+    N сделок пользователя читаются N переходами по смещениям, без просмотра
+    всего журнала. Запись выполняется под межпроцессной блокировкой, а fsync —
+    группами, как в журнале портфелей (GroupSync).
+    """
+
+    def __init__(self, directory: Path, group_size: int = 32, flush_interval: float = 0.05) -> None:
+        self.directory = Path(directory)
+        self.path = self.directory / "trades.jsonl"
+        self.heads_path = self.directory / "heads.idx"
+        self._file_lock = FileLock(self.directory / "ledger.lock")
+
+        self._file = None
+        self._heads = None
+        self._open_lock = threading.Lock()
+        self._group = GroupSync(self._fsync, group_size, flush_interval)
+
+    def _fsync(self) -> None:
+        os.fsync(self._file.fileno())
+
+    def _open(self) -> None:
+        with self._open_lock:
+            if self._file is not None:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # без буферизации: другие процессы дописывают те же файлы
+            self._file = open(self.path, "a+b", buffering=0)
+            fd = os.open(self.heads_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._heads = os.fdopen(fd, "r+b", buffering=0)
+            atexit.register(self.close)
+
+    @staticmethod
+    def _head(heads, user_id: int) -> int | None:
+        heads.seek(user_id * HEAD.size)
+        raw = heads.read(HEAD.size)
+        if len(raw) < HEAD.size:
+            return None
+        offset = HEAD.unpack(raw)[0]
+        return offset - 1 if offset else None
+
+    def append(self, record: dict) -> int:
+        """Дописывает сделку и возвращает её смещение в журнале."""
+        self._open()
+        user_id = int(record["user_id"])
+
+        with self._group.lock, self._file_lock:
+            f = self._file
+            offset = f.seek(0, os.SEEK_END)
+            prefix = b""
+            if offset:
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    # недописанная строка после сбоя: новая запись начинается с новой строки
+                    prefix = b"\n"
+                    offset += 1
+
+            line = json.dumps(
+                {**record, "prev": self._head(self._heads, user_id)},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            f.write(prefix + line.encode("utf-8") + b"\n")
+
+            self._heads.seek(user_id * HEAD.size)
+            self._heads.write(HEAD.pack(offset + 1))
+            self._group.written()
+
+        return offset
+
+    def sync(self) -> None:
+        if self._file is not None:
+            self._group.sync()
+
+    def close(self) -> None:
+        with self._open_lock:
+            if self._file is None:
+                return
+            self._group.sync()
+            self._file.close()
+            self._heads.close()
+            self._file = None
+            self._heads = None
+            atexit.unregister(self.close)
+
+    def tail(self, user_id: int, limit: int) -> list[dict]:
+        """Последние limit сделок пользователя, новые первыми.
+
+        Цепочка обрывается на записи, которая не дошла до диска до сбоя
+        (смещение за концом файла или чужая строка).
+        """
+        try:
+            with self.heads_path.open("rb") as heads:
+                offset = self._head(heads, user_id)
+        except FileNotFoundError:
+            return []
+
+        trades = []
+        if offset is None:
+            return trades
+
+        with self.path.open("rb") as f:
+            while offset is not None and len(trades) < limit:
+                f.seek(offset)
+                try:
+                    record = json.loads(f.readline())
+                except json.JSONDecodeError:
+                    break
+                if record.get("user_id") != user_id:
+                    break
+                trades.append(record)
+                offset = record.pop("prev")
+        return trades
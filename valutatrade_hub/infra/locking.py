@@ -0,0 +1,61 @@
+import os
+from pathlib import Path
+
+from valutatrade_hub.core.exceptions import LockBusyError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Межпроцессная advisory-блокировка на файле (fcntl.flock, на Windows — msvcrt).
+
+    shared=True — разделяемая блокировка (несколько держателей одновременно),
+    на Windows она работает как исключительная.
+    """
+
+    def __init__(self, path: Path, blocking: bool = True, shared: bool = False) -> None:
+        self.path = Path(path)
+        self.blocking = blocking
+        self.shared = shared
+        self._fd: int | None = None
+
+    def acquire(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            if fcntl is not None:
+                flags = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                if not self.blocking:
+                    flags |= fcntl.LOCK_NB
+                fcntl.flock(fd, flags)
+            else:
+                mode = msvcrt.LK_LOCK if self.blocking else msvcrt.LK_NBLCK
+                msvcrt.locking(fd, mode, 1)
+        except OSError:
+            os.close(fd)
+            raise LockBusyError(str(self.path))
+
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
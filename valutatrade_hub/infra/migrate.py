@@ -0,0 +1,42 @@
+import argparse
+from pathlib import Path
+
+from valutatrade_hub.infra.backends import migrate_json_to_sqlite, reshard_portfolios
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = SettingsLoader()
+
+    parser = argparse.ArgumentParser(
+        prog="python -m valutatrade_hub.infra.migrate",
+        description="Миграция данных ValutaTrade Hub",
+    )
+    parser.add_argument("--data-dir", type=Path, default=settings.get("DATA_DIR"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("json-to-sqlite", help="перенести users.json и portfolios.json в SQLite")
+    reshard = sub.add_parser("reshard", help="разбить портфели JSON-хранилища на шарды")
+    reshard.add_argument("--shards", type=int, required=True)
+
+    args = parser.parse_args(argv)
+
+    match args.command:
+        case "json-to-sqlite":
+            result = migrate_json_to_sqlite(args.data_dir)
+            print(
+                f"Перенесено пользователей: {result['users']}, "
+                f"портфелей: {result['portfolios']}. "
+                f"Укажите storage_backend = \"sqlite\" в [tool.valutatrade]."
+            )
+        case "reshard":
+            if args.shards < 1:
+                parser.error("--shards должно быть не меньше 1")
+            result = reshard_portfolios(args.data_dir, args.shards)
+            print(
+                f"Портфелей: {result['portfolios']}, шардов: {result['from']} -> {result['to']}. "
+                f"Укажите portfolio_shards = {result['to']} в [tool.valutatrade]."
+            )
+
+
+if __name__ == "__main__":
+    main()
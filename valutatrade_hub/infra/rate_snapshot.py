@@ -0,0 +1,244 @@
+import math
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from valutatrade_hub.core.currencies import get_registry
+
+
+SNAPSHOT_FILENAME = "rates.bin"
+
+MAGIC = b"VTRS"
+FORMAT_VERSION = 2
+
+# magic, version, reserved, generation (uint64), last_refresh (unix, nan — нет), count, capacity,
+# отпечаток реестра валют, по id которого записаны пары
+HEADER = struct.Struct("<4sHHQdIIQ")
+GENERATION = struct.Struct("<Q")
+GENERATION_OFFSET = 8
+
+# имена источников: фиксированная таблица строк utf-8
+SOURCE_SLOTS = 16
+SOURCE_SIZE = 32
+SOURCES_OFFSET = HEADER.size
+
+# src_id, dst_id (id валют реестра), source_id, rate, updated_at (unix)
+ENTRY = struct.Struct("<HHHxxdd")
+ENTRIES_OFFSET = SOURCES_OFFSET + SOURCE_SLOTS * SOURCE_SIZE
+
+MIN_CAPACITY = 256
+
+# поколение, которым помечается заменённый файл: читатель переоткрывает путь
+MOVED = 2**64 - 1
+
+READ_TIMEOUT = 1.0
+
+
+class RateEntry(NamedTuple):
+    pair: str
+    rate: float
+    updated_at: float
+    source: str
+
+
+class SnapshotData(NamedTuple):
+    generation: int
+    last_refresh: float | None
+    sources: list[str]
+    # (src_id, dst_id, source_id, rate, updated_at) — без построения строк
+    records: list[tuple[int, int, int, float, float]]
+
+    def entries(self) -> list[RateEntry]:
+        codes = get_registry().codes
+        return [
+            RateEntry(f"{codes[src]}_{codes[dst]}", rate, updated_at, self.sources[source_id])
+            for src, dst, source_id, rate, updated_at in self.records
+        ]
+
+
+class RateSnapshot:
+    """Бинарный снимок курсов в файле фиксированной разметки.
+
+    Заголовок, таблица источников и таблица записей (id пары в реестре
+    валют → курс, updated_at, источник). Процессы читают файл через mmap без
+    блокировок и разбора JSON; согласованность обеспечивает счётчик поколений
+    (seqlock): писатель делает его нечётным на время записи и чётным после,
+    а читатель повторяет чтение, если поколение было нечётным или изменилось.
+
+    Писатель один (update-rates и демон работают под updater.lock). Если
+    записей больше, чем вмещает файл, или файл построен по другому реестру
+    валют, он пересоздаётся и атомарно заменяется, а в старом файле поколение
+    выставляется в MOVED.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._file = None
+        self._mm: mmap.mmap | None = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def is_current(self) -> bool:
+        """Снимок есть, читается и записан по id текущего реестра валют."""
+        try:
+            self.generation()
+        except (FileNotFoundError, ValueError):
+            return False
+        return HEADER.unpack_from(self._mm)[7] == get_registry().fingerprint
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+        self._mm = None
+        self._file = None
+
+    def _open(self, writable: bool) -> mmap.mmap:
+        self.close()
+        self._file = self.path.open("r+b" if writable else "rb")
+        try:
+            mm = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            )
+        except ValueError:
+            self._file.close()
+            self._file = None
+            raise ValueError(f"Файл {self.path} повреждён")
+
+        magic, version = struct.unpack_from("<4sH", mm)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            mm.close()
+            self._file.close()
+            self._file = None
+            raise ValueError(f"Файл {self.path} не является снимком курсов")
+        self._mm = mm
+        return mm
+
+    # чтение
+
+    def generation(self) -> int:
+        """Текущее поколение снимка; FileNotFoundError, если снимка ещё нет."""
+        if self._mm is None:
+            self._open(writable=False)
+        generation = GENERATION.unpack_from(self._mm, GENERATION_OFFSET)[0]
+        if generation == MOVED:
+            self._open(writable=False)
+            generation = GENERATION.unpack_from(self._mm, GENERATION_OFFSET)[0]
+        return generation
+
+    def read(self) -> SnapshotData:
+        deadline = time.monotonic() + READ_TIMEOUT
+        while True:
+            before = self.generation()
+            if before % 2 == 0:
+                mm = self._mm
+                _, _, _, _, last_refresh, count, capacity, fingerprint = HEADER.unpack_from(mm)
+                if fingerprint != get_registry().fingerprint:
+                    raise ValueError(f"Снимок курсов {self.path} построен по другому реестру валют")
+                count = min(count, capacity)
+                sources = mm[SOURCES_OFFSET:ENTRIES_OFFSET]
+                entries = mm[ENTRIES_OFFSET:ENTRIES_OFFSET + count * ENTRY.size]
+                if GENERATION.unpack_from(mm, GENERATION_OFFSET)[0] == before:
+                    return self._decode(before, last_refresh, sources, entries)
+
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Снимок курсов {self.path} не удалось прочитать согласованно")
+            time.sleep(0)
+
+    @staticmethod
+    def _decode(generation: int, last_refresh: float, sources: bytes, entries: bytes) -> SnapshotData:
+        names = [
+            sources[i * SOURCE_SIZE:(i + 1) * SOURCE_SIZE].rstrip(b"\0").decode("utf-8")
+            for i in range(SOURCE_SLOTS)
+        ]
+        return SnapshotData(
+            generation,
+            None if math.isnan(last_refresh) else last_refresh,
+            names,
+            list(ENTRY.iter_unpack(entries)),
+        )
+
+    # запись
+
+    @staticmethod
+    def _encode(entries: list[RateEntry]) -> tuple[bytes, bytes]:
+        ids = get_registry().ids
+        sources: list[str] = []
+        body = bytearray()
+        for entry in entries:
+            src, _, dst = entry.pair.partition("_")
+            if src not in ids or dst not in ids:
+                continue
+            if entry.source not in sources:
+                if len(sources) == SOURCE_SLOTS:
+                    raise ValueError(f"В снимке курсов не больше {SOURCE_SLOTS} источников")
+                sources.append(entry.source)
+            body += ENTRY.pack(ids[src], ids[dst], sources.index(entry.source), entry.rate, entry.updated_at)
+
+        table = bytearray(SOURCE_SLOTS * SOURCE_SIZE)
+        for i, name in enumerate(sources):
+            raw = name.encode("utf-8")[:SOURCE_SIZE]
+            table[i * SOURCE_SIZE:i * SOURCE_SIZE + len(raw)] = raw
+        return bytes(table), bytes(body)
+
+    def write(self, entries: list[RateEntry], last_refresh: float | None) -> None:
+        sources, body = self._encode(entries)
+        count = len(body) // ENTRY.size
+        refresh = math.nan if last_refresh is None else last_refresh
+
+        try:
+            mm = self._open(writable=True)
+        except (FileNotFoundError, ValueError):
+            mm = None
+
+        if (
+            mm is None
+            or HEADER.unpack_from(mm)[6] < count
+            or HEADER.unpack_from(mm)[7] != get_registry().fingerprint
+        ):
+            self._replace(sources, body, count, refresh)
+            return
+
+        generation = GENERATION.unpack_from(mm, GENERATION_OFFSET)[0]
+        # нечётное поколение остаётся после сбоя писателя посреди записи
+        generation += generation % 2
+
+        GENERATION.pack_into(mm, GENERATION_OFFSET, generation + 1)
+        mm[SOURCES_OFFSET:ENTRIES_OFFSET] = sources
+        mm[ENTRIES_OFFSET:ENTRIES_OFFSET + len(body)] = body
+        struct.pack_into("<dI", mm, GENERATION_OFFSET + 8, refresh, count)
+        GENERATION.pack_into(mm, GENERATION_OFFSET, generation + 2)
+        mm.flush()
+        self.close()
+
+    def _replace(self, sources: bytes, body: bytes, count: int, refresh: float) -> None:
+        generation = 0
+        if self._mm is not None:
+            generation = GENERATION.unpack_from(self._mm, GENERATION_OFFSET)[0]
+            generation += generation % 2 + 2
+
+        capacity = max(MIN_CAPACITY, count * 2)
+        data = bytearray(ENTRIES_OFFSET + capacity * ENTRY.size)
+        HEADER.pack_into(
+            data, 0, MAGIC, FORMAT_VERSION, 0, generation, refresh, count, capacity,
+            get_registry().fingerprint,
+        )
+        data[SOURCES_OFFSET:ENTRIES_OFFSET] = sources
+        data[ENTRIES_OFFSET:ENTRIES_OFFSET + len(body)] = body
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp_path.open("wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        if self._mm is not None:
+            GENERATION.pack_into(self._mm, GENERATION_OFFSET, MOVED)
+            self._mm.flush()
+        self.close()
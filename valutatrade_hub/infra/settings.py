@@ -16,9 +16,23 @@ class SettingsLoader:
         defaults = {
             "DATA_DIR": Path("data"),
             "RATES_TTL_SECONDS": 300,
+            "RATE_CHANGE_EPSILON": 1e-6,
             "DEFAULT_BASE_CURRENCY": "USD",
             "LOG_LEVEL": "INFO",
             "LOG_PATH": Path("logs/actions.log"),
+            "STORAGE_BACKEND": "json",
+            "JOURNAL_ENABLED": True,
+            "JOURNAL_GROUP_SIZE": 32,
+            "JOURNAL_FLUSH_INTERVAL_MS": 50,
+            "JOURNAL_COMPACT_EVERY": 1000,
+            "PORTFOLIO_SHARDS": 1,
+            "PASSWORD_HASHER": "scrypt",
+            "PASSWORD_HASHER_PARAMS": {},
+            "SESSION_TTL_SECONDS": 3600,
+            "API_HOST": "127.0.0.1",
+            "API_PORT": 8080,
+            "CURRENCIES_FILE": None,
+            "COST_BASIS_METHOD": "fifo",
         }
 
         config = {}
@@ -34,12 +48,40 @@ class SettingsLoader:
             self._settings["DATA_DIR"] = Path(str(config["data_dir"]))
         if "rates_ttl_seconds" in config:
             self._settings["RATES_TTL_SECONDS"] = int(config["rates_ttl_seconds"])
+        if "rate_change_epsilon" in config:
+            self._settings["RATE_CHANGE_EPSILON"] = float(config["rate_change_epsilon"])
         if "default_base_currency" in config:
             self._settings["DEFAULT_BASE_CURRENCY"] = str(config["default_base_currency"]).upper()
         if "log_level" in config:
             self._settings["LOG_LEVEL"] = str(config["log_level"]).upper()
         if "log_path" in config:
             self._settings["LOG_PATH"] = Path(str(config["log_path"]))
+        if "storage_backend" in config:
+            self._settings["STORAGE_BACKEND"] = str(config["storage_backend"]).lower()
+        if "journal_enabled" in config:
+            self._settings["JOURNAL_ENABLED"] = bool(config["journal_enabled"])
+        if "journal_group_size" in config:
+            self._settings["JOURNAL_GROUP_SIZE"] = int(config["journal_group_size"])
+        if "journal_flush_interval_ms" in config:
+            self._settings["JOURNAL_FLUSH_INTERVAL_MS"] = int(config["journal_flush_interval_ms"])
+        if "journal_compact_every" in config:
+            self._settings["JOURNAL_COMPACT_EVERY"] = int(config["journal_compact_every"])
+        if "portfolio_shards" in config:
+            self._settings["PORTFOLIO_SHARDS"] = max(1, int(config["portfolio_shards"]))
+        if "password_hasher" in config:
+            self._settings["PASSWORD_HASHER"] = str(config["password_hasher"]).lower()
+        if "password_hasher_params" in config:
+            self._settings["PASSWORD_HASHER_PARAMS"] = dict(config["password_hasher_params"])
+        if "session_ttl_seconds" in config:
+            self._settings["SESSION_TTL_SECONDS"] = int(config["session_ttl_seconds"])
+        if "api_host" in config:
+            self._settings["API_HOST"] = str(config["api_host"])
+        if "api_port" in config:
+            self._settings["API_PORT"] = int(config["api_port"])
+        if "currencies_file" in config:
+            self._settings["CURRENCIES_FILE"] = Path(str(config["currencies_file"]))
+        if "cost_basis_method" in config:
+            self._settings["COST_BASIS_METHOD"] = str(config["cost_basis_method"]).lower()
 
 
     def get(self, key: str, default: Any = None) -> Any:
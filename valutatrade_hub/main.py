@@ -1,14 +1,46 @@
+import argparse
 
-from valutatrade_hub.cli.interface import run_cli
+from valutatrade_hub.api.server import run_server
+from valutatrade_hub.cli.interface import run_batch, run_cli, run_pnl_report
+from valutatrade_hub.parser_service.scheduler import run_daemon
 
 
 
 
 def main():
-
-    run_cli()
+    parser = argparse.ArgumentParser(prog="project", description="ValutaTrade Hub")
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="выполнить команды из файла ('-' — из stdin) в одной транзакции",
+    )
+    sub = parser.add_subparsers(dest="command")
+
+    daemon = sub.add_parser("daemon", help="фоновое обновление курсов по TTL")
+    daemon.add_argument("--source", choices=["coingecko", "exchangerate"])
+
+    serve = sub.add_parser("serve", help="HTTP/JSON API для других сервисов")
+    serve.add_argument("--host")
+    serve.add_argument("--port", type=int)
+
+    report = sub.add_parser("pnl-report", help="P&L всех пользователей в CSV на конец дня")
+    report.add_argument("--base", help="базовая валюта отчёта (по умолчанию default_base_currency)")
+    report.add_argument("--output", metavar="FILE", help="файл CSV (по умолчанию stdout)")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "daemon":
+            run_daemon(args.source)
+        case "serve":
+            run_server(args.host, args.port)
+        case "pnl-report":
+            run_pnl_report(args.base, args.output)
+        case _ if args.batch:
+            run_batch(args.batch)
+        case _:
+            run_cli()
 
 
 if __name__ == "__main__":
     main()
-    
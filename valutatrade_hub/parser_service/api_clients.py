@@ -1,40 +1,174 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
+from pathlib import Path
 from typing import Dict
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.core.exceptions import ApiRequestError, LockBusyError
+from valutatrade_hub.infra.locking import FileLock
 from valutatrade_hub.parser_service.config import ParserConfig
 
 
+class HttpCache:
+    """Валидаторы (ETag, Last-Modified), срок свежести и последние курсы по источникам.
+
+    Клиенты работают в параллельных потоках и процессах над одним файлом,
+    поэтому чтение-изменение-запись идёт под общей блокировкой потоков и
+    межпроцессной блокировкой файла. Кеш — только оптимизация: ошибки его
+    чтения и записи не прерывают обновление курсов.
+    """
+
+    # один на процесс: клиенты с разными экземплярами кеша пишут в один файл
+    _lock = threading.Lock()
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._file_lock_path = self.path.with_suffix(self.path.suffix + ".lock")
+
+    def _load(self) -> dict:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def get(self, source: str) -> dict | None:
+        with self._lock:
+            return self._load().get(source)
+
+    def put(self, source: str, entry: dict) -> None:
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with FileLock(self._file_lock_path):
+                    data = self._load()
+                    data[source] = entry
+                    self._write(data)
+            except (OSError, LockBusyError):
+                pass
+
+    def _write(self, data: dict) -> None:
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
 class BaseApiClient(ABC):
-    def __init__(self, config: ParserConfig):
+    """Клиент API курсов с общим keep-alive пулом соединений и условными запросами.
+
+    Ответ 304 Not Modified и ещё не истёкший срок свежести (Cache-Control
+    max-age или подсказка провайдера) возвращают курсы из кеша без разбора ответа.
+    """
+
+    _session: requests.Session | None = None
+    _session_lock = threading.Lock()
+
+    source_label = "API"
+
+    def __init__(self, config: ParserConfig, cache: HttpCache | None = None):
         self.config = config
+        self.cache = cache or HttpCache(config.HTTP_CACHE_FILE_PATH)
+
+    @classmethod
+    def session(cls) -> requests.Session:
+        with BaseApiClient._session_lock:
+            if BaseApiClient._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                BaseApiClient._session = session
+            return BaseApiClient._session
+
+    @property
+    def source_name(self) -> str:
+        return self.__class__.__name__
 
     @abstractmethod
-    def fetch_rates(self) -> Dict[str, float]:
+    def _request_args(self) -> tuple[str, dict | None]:
         raise NotImplementedError
 
+    @abstractmethod
+    def _parse_rates(self, data: dict) -> Dict[str, float]:
+        raise NotImplementedError
+
+    def _expires_at(self, response: requests.Response, data: dict | None) -> float:
+        match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+        if match:
+            return time.time() + int(match.group(1))
+        return 0.0
 
-class CoinGeckoClient(BaseApiClient):
     def fetch_rates(self) -> Dict[str, float]:
-        ids = ",".join(self.config.CRYPTO_ID_MAP.values())
-        params = {
-            "ids": ids,
-            "vs_currencies": self.config.BASE_CURRENCY.lower(),
-        }
+        entry = self.cache.get(self.source_name)
+        if entry and entry.get("expires_at", 0) > time.time():
+            return dict(entry["rates"])
+
+        url, params = self._request_args()
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
 
         try:
-            response = requests.get(
-                self.config.COINGECKO_URL,
+            response = self.session().get(
+                url,
                 params=params,
+                headers=headers,
                 timeout=self.config.REQUEST_TIMEOUT,
             )
+            if response.status_code == 304 and entry:
+                entry["expires_at"] = self._expires_at(response, None)
+                self.cache.put(self.source_name, entry)
+                return dict(entry["rates"])
+
             response.raise_for_status()
             data = response.json()
         except requests.exceptions.RequestException as e:
-            raise ApiRequestError(f"CoinGecko error: {e}")
+            raise ApiRequestError(f"{self.source_label} error: {e}")
+
+        rates = self._parse_rates(data)
+
+        self.cache.put(self.source_name, {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "expires_at": self._expires_at(response, data),
+            "rates": rates,
+        })
+
+        return rates
 
+
+class CoinGeckoClient(BaseApiClient):
+    source_label = "CoinGecko"
+
+    def _request_args(self) -> tuple[str, dict | None]:
+        ids = ",".join(self.config.CRYPTO_ID_MAP.values())
+        params = {
+            "ids": ids,
+            "vs_currencies": self.config.BASE_CURRENCY.lower(),
+        }
+        return self.config.COINGECKO_URL, params
+
+    def _parse_rates(self, data: dict) -> Dict[str, float]:
         rates: Dict[str, float] = {}
 
         for code, coin_id in self.config.CRYPTO_ID_MAP.items():
@@ -49,7 +183,9 @@ class CoinGeckoClient(BaseApiClient):
 
 
 class ExchangeRateApiClient(BaseApiClient):
-    def fetch_rates(self):
+    source_label = "ExchangeRate-API"
+
+    def _request_args(self) -> tuple[str, dict | None]:
         if not self.config.EXCHANGERATE_API_KEY:
             raise ApiRequestError("ExchangeRate API key not configured")
 
@@ -58,14 +194,15 @@ class ExchangeRateApiClient(BaseApiClient):
             f"{self.config.EXCHANGERATE_API_KEY}/latest/"
             f"{self.config.BASE_CURRENCY}"
         )
+        return url, None
 
-        try:
-            response = requests.get(url, timeout=self.config.REQUEST_TIMEOUT)
-            response.raise_for_status()
-            data = response.json()
-        except requests.exceptions.RequestException as e:
-            raise ApiRequestError(f"ExchangeRate-API error: {e}")
+    def _expires_at(self, response: requests.Response, data: dict | None) -> float:
+        next_update = (data or {}).get("time_next_update_unix")
+        if isinstance(next_update, (int, float)) and next_update > time.time():
+            return float(next_update)
+        return super()._expires_at(response, data)
 
+    def _parse_rates(self, data: dict) -> Dict[str, float]:
         if data.get("result") != "success":
             raise ApiRequestError("ExchangeRate-API returned non-success result")
 
@@ -80,13 +217,9 @@ class ExchangeRateApiClient(BaseApiClient):
             if code == base:
                 continue
             try:
-                base_to_code = float(conversion_rates[code])  
-                rates[f"{code}_{base}"] = 1 / base_to_code  
+                base_to_code = float(conversion_rates[code])
+                rates[f"{code}_{base}"] = 1 / base_to_code
             except (KeyError, TypeError, ZeroDivisionError, ValueError):
                 continue
 
         return rates
-
-
-
-
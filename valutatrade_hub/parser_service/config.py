@@ -5,8 +5,12 @@ from dataclasses import dataclass, field
 @dataclass(frozen=True)
 class ParserConfig:
     EXCHANGERATE_API_KEY: str | None = os.getenv("EXCHANGERATE_API_KEY")
-    COINGECKO_URL: str = "https://api.coingecko.com/api/v3/simple/price"
-    EXCHANGERATE_API_URL: str = "https://v6.exchangerate-api.com/v6"
+    COINGECKO_URL: str = os.getenv(
+        "COINGECKO_URL", "https://api.coingecko.com/api/v3/simple/price"
+    )
+    EXCHANGERATE_API_URL: str = os.getenv(
+        "EXCHANGERATE_API_URL", "https://v6.exchangerate-api.com/v6"
+    )
     BASE_CURRENCY: str = "USD"
     FIAT_CURRENCIES: tuple[str, ...] = ("EUR", "GBP", "RUB")
     CRYPTO_CURRENCIES: tuple[str, ...] = ("BTC", "ETH", "SOL")
@@ -19,4 +23,11 @@ class ParserConfig:
     )
     RATES_FILE_PATH: str = "data/rates.json"
     HISTORY_FILE_PATH: str = "data/exchange_rates.json"
+    HISTORY_DIR_PATH: str = "data/history"
+    HTTP_CACHE_FILE_PATH: str = "data/http_cache.json"
     REQUEST_TIMEOUT: int = 10
+    UPDATE_DEADLINE: float = 12.0
+    SCHEDULE_REFRESH_RATIO: float = 0.8
+    SCHEDULE_JITTER: float = 0.1
+    BACKOFF_BASE_SECONDS: float = 5.0
+    BACKOFF_MAX_SECONDS: float = 120.0
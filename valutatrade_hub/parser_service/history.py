@@ -0,0 +1,442 @@
+import json
+import mmap
+import struct
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+
+# timestamp (unix, float64), pair_id (uint32), rate (float64), source_id (uint16)
+RECORD = struct.Struct("<dIdH")
+
+# bucket_start (unix, int64), pair_id (uint32), open, high, low, close (float64), count (uint32)
+BAR = struct.Struct("<qIddddI")
+
+# временной индекс пары: timestamp (unix, float64), rate (float64)
+INDEX_ENTRY = struct.Struct("<dd")
+
+HOUR = 3600
+DAY = 86400
+
+# интервал агрегата -> формат имени файла, в котором лежат его бары
+ROLLUPS = {
+    HOUR: "%Y-%m-%d",
+    DAY: "%Y-%m",
+}
+
+_INTERVAL_UNITS = {"m": 60, "h": HOUR, "d": DAY}
+
+
+def parse_interval(value: str) -> int:
+    """'15m', '1h', '4h', '1d' -> секунды."""
+    value = str(value).strip().lower()
+    unit = _INTERVAL_UNITS.get(value[-1:])
+    if unit is None or not value[:-1].isdigit() or int(value[:-1]) <= 0:
+        raise ValueError("Интервал задаётся как <N>m, <N>h или <N>d, например 1h")
+    return int(value[:-1]) * unit
+
+
+class HistoryRecord(NamedTuple):
+    timestamp: float
+    pair: str
+    rate: float
+    source: str
+
+
+class _SegmentTimestamps:
+    """Последовательность timestamp'ов сегмента или индекса для bisect без копирования."""
+
+    def __init__(self, buf, record: struct.Struct = RECORD) -> None:
+        self.buf = buf
+        self.record = record
+
+    def __len__(self) -> int:
+        return len(self.buf) // self.record.size
+
+    def __getitem__(self, i: int) -> float:
+        return self.record.unpack_from(self.buf, i * self.record.size)[0]
+
+
+class HistoryStore:
+    """Append-only история курсов в посуточных бинарных сегментах.
+
+    Каждый сегмент YYYY-MM-DD.bin — записи фиксированной длины в порядке
+    времени. Коды пар и источников хранятся один раз в dictionary.json,
+    а в записях — их номера. При добавлении записей сразу обновляются
+    часовые и дневные OHLC-бары в rollups/, поэтому запросы по месяцам
+    истории не читают сырые записи, и временной индекс пары
+    index/<PAIR>.idx (отсортированные timestamp и курс), по которому курс
+    на момент времени ищется двоичным поиском.
+
+    Писать (append, rebuild_index) можно только под RatesUpdater.lock().
+    Читатели индекс не создают: если его ещё нет, курс ищется по сегментам.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._dictionary_path = self.directory / "dictionary.json"
+        self._load_dictionary()
+
+    def _load_dictionary(self) -> None:
+        try:
+            with self._dictionary_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {"pairs": [], "sources": []}
+
+        self.pairs: list[str] = data["pairs"]
+        self.sources: list[str] = data["sources"]
+        self.pair_ids = {p: i for i, p in enumerate(self.pairs)}
+        self.source_ids = {s: i for i, s in enumerate(self.sources)}
+
+    def _save_dictionary(self) -> None:
+        tmp_path = self._dictionary_path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"pairs": self.pairs, "sources": self.sources}, f, ensure_ascii=False)
+        tmp_path.replace(self._dictionary_path)
+
+    def _intern(self, table: list[str], ids: dict[str, int], value: str) -> tuple[int, bool]:
+        if value in ids:
+            return ids[value], False
+        ids[value] = len(table)
+        table.append(value)
+        return ids[value], True
+
+    @staticmethod
+    def _day(ts: float) -> str:
+        return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+    def segment_path(self, day: str) -> Path:
+        return self.directory / f"{day}.bin"
+
+    def append(self, records: list[HistoryRecord]) -> None:
+        if not records:
+            return
+
+        # история, записанная до появления индекса, индексируется целиком
+        self._ensure_index()
+
+        # другой процесс мог добавить новые пары в словарь
+        self._load_dictionary()
+
+        changed = False
+        chunks: dict[str, bytearray] = {}
+        for r in records:
+            pair_id, new_pair = self._intern(self.pairs, self.pair_ids, r.pair)
+            source_id, new_source = self._intern(self.sources, self.source_ids, r.source)
+            changed = changed or new_pair or new_source
+            chunk = chunks.setdefault(self._day(r.timestamp), bytearray())
+            chunk += RECORD.pack(r.timestamp, pair_id, r.rate, source_id)
+
+        if changed:
+            self._save_dictionary()
+
+        # индекс дополняется раньше сегментов, чтобы не отставать от них
+        self._update_index(records)
+
+        for day, chunk in chunks.items():
+            with self.segment_path(day).open("ab") as f:
+                f.write(chunk)
+
+        for interval in ROLLUPS:
+            self._update_rollup(interval, records)
+
+    # курс на момент времени
+
+    @property
+    def index_dir(self) -> Path:
+        return self.directory / "index"
+
+    def _index_path(self, pair: str) -> Path:
+        return self.index_dir / f"{pair}.idx"
+
+    def _ensure_index(self) -> None:
+        if not self.index_dir.exists():
+            self.rebuild_index()
+
+    def rebuild_index(self) -> None:
+        """Пересобирает временные индексы всех пар по сегментам истории (под блокировкой обновлятора)."""
+        tmp_dir = self.directory / "index.tmp"
+        if tmp_dir.exists():
+            for path in tmp_dir.iterdir():
+                path.unlink()
+        tmp_dir.mkdir(exist_ok=True)
+
+        self._load_dictionary()
+        by_pair: dict[str, list[tuple[float, float]]] = {}
+        for path in sorted(self.directory.glob("*.bin")):
+            data = path.read_bytes()
+            for ts, pid, rate, _ in RECORD.iter_unpack(data[: len(data) // RECORD.size * RECORD.size]):
+                by_pair.setdefault(self.pairs[pid], []).append((ts, rate))
+
+        for pair, points in by_pair.items():
+            points.sort(key=lambda p: p[0])
+            with (tmp_dir / f"{pair}.idx").open("wb") as f:
+                f.write(b"".join(INDEX_ENTRY.pack(ts, rate) for ts, rate in points))
+
+        if self.index_dir.exists():
+            for path in self.index_dir.iterdir():
+                path.unlink()
+            self.index_dir.rmdir()
+        tmp_dir.replace(self.index_dir)
+
+    def _update_index(self, records: list[HistoryRecord]) -> None:
+        by_pair: dict[str, list[tuple[float, float]]] = {}
+        for r in records:
+            by_pair.setdefault(r.pair, []).append((r.timestamp, r.rate))
+
+        self.index_dir.mkdir(exist_ok=True)
+        for pair, points in by_pair.items():
+            points.sort(key=lambda p: p[0])
+            path = self._index_path(pair)
+            try:
+                data = path.read_bytes() if path.stat().st_size else b""
+            except FileNotFoundError:
+                data = b""
+            # недописанная запись после сбоя отбрасывается
+            data = data[: len(data) // INDEX_ENTRY.size * INDEX_ENTRY.size]
+
+            last = INDEX_ENTRY.unpack_from(data, len(data) - INDEX_ENTRY.size)[0] if data else None
+            if last is None or points[0][0] >= last:
+                with path.open("r+b" if path.exists() else "wb") as f:
+                    f.truncate(len(data))
+                    f.seek(len(data))
+                    f.write(b"".join(INDEX_ENTRY.pack(ts, rate) for ts, rate in points))
+                continue
+
+            # запись задним числом: индекс переписывается отсортированным
+            merged = sorted(list(INDEX_ENTRY.iter_unpack(data)) + points, key=lambda p: p[0])
+            tmp_path = path.with_suffix(".tmp")
+            with tmp_path.open("wb") as f:
+                f.write(b"".join(INDEX_ENTRY.pack(ts, rate) for ts, rate in merged))
+            tmp_path.replace(path)
+
+    def rate_at(self, pair: str, ts: float) -> tuple[float, float] | None:
+        """Курс пары, действовавший в момент ts, и время его записи (None — записей нет)."""
+        if not self.index_dir.exists():
+            return self._scan_rates_at(ts, pair).get(pair)
+
+        path = self._index_path(pair)
+        try:
+            f = path.open("rb")
+        except FileNotFoundError:
+            return None
+
+        with f:
+            if path.stat().st_size < INDEX_ENTRY.size:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                i = bisect_right(_SegmentTimestamps(mm, INDEX_ENTRY), ts)
+                if i == 0:
+                    return None
+                recorded, rate = INDEX_ENTRY.unpack_from(mm, (i - 1) * INDEX_ENTRY.size)
+                return rate, recorded
+
+    def rates_at(self, ts: float) -> list[tuple[str, float, float]]:
+        """Курсы всех пар истории на момент ts: (пара, курс, время записи)."""
+        if not self.index_dir.exists():
+            found = self._scan_rates_at(ts)
+            return [(pair, *found[pair]) for pair in sorted(found)]
+
+        result = []
+        for path in sorted(self.index_dir.glob("*.idx")):
+            found = self.rate_at(path.stem, ts)
+            if found is not None:
+                result.append((path.stem, *found))
+        return result
+
+    def _scan_rates_at(self, ts: float, pair: str | None = None) -> dict[str, tuple[float, float]]:
+        """Курсы на момент ts просмотром сегментов от ts назад — для истории без индекса."""
+        self._load_dictionary()
+        if pair is not None and pair not in self.pair_ids:
+            return {}
+        wanted = {self.pair_ids[pair]} if pair is not None else set(range(len(self.pairs)))
+
+        found: dict[int, tuple[float, float]] = {}
+        for path in reversed(self.segments(0, ts)):
+            data = path.read_bytes()
+            # записи задним числом дописываются в конец сегмента, поэтому он просматривается целиком
+            for recorded, pid, rate, _ in RECORD.iter_unpack(data[: len(data) // RECORD.size * RECORD.size]):
+                if pid in wanted and recorded <= ts and recorded >= found.get(pid, (0.0, -1.0))[1]:
+                    found[pid] = (rate, recorded)
+            # в более ранних сегментах записи только старше
+            wanted -= found.keys()
+            if not wanted:
+                break
+        return {self.pairs[pid]: value for pid, value in found.items()}
+
+    # OHLC
+
+    def _rollup_path(self, interval: int, ts: float) -> Path:
+        name = datetime.fromtimestamp(ts, timezone.utc).strftime(ROLLUPS[interval])
+        return self.directory / "rollups" / str(interval) / f"{name}.ohlc"
+
+    @staticmethod
+    def _read_bars(path: Path) -> dict[tuple[int, int], list]:
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return {}
+        bars = {}
+        for bucket, pid, o, h, low, c, n in BAR.iter_unpack(data[: len(data) // BAR.size * BAR.size]):
+            bars[(bucket, pid)] = [o, h, low, c, n]
+        return bars
+
+    def _update_rollup(self, interval: int, records: list[HistoryRecord]) -> None:
+        by_file: dict[Path, list[HistoryRecord]] = {}
+        for r in records:
+            by_file.setdefault(self._rollup_path(interval, r.timestamp), []).append(r)
+
+        for path, file_records in by_file.items():
+            bars = self._read_bars(path)
+            for r in sorted(file_records, key=lambda r: r.timestamp):
+                key = (int(r.timestamp // interval) * interval, self.pair_ids[r.pair])
+                bar = bars.get(key)
+                if bar is None:
+                    bars[key] = [r.rate, r.rate, r.rate, r.rate, 1]
+                else:
+                    bar[1] = max(bar[1], r.rate)
+                    bar[2] = min(bar[2], r.rate)
+                    bar[3] = r.rate
+                    bar[4] += 1
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with tmp_path.open("wb") as f:
+                for (bucket, pid), bar in sorted(bars.items()):
+                    f.write(BAR.pack(bucket, pid, *bar))
+            tmp_path.replace(path)
+
+    def _rollup_bars(self, interval: int, pair_id: int, start: float, end: float):
+        """Бары пары за [start, end] по времени: готовые — для часов/суток целиком внутри
+        диапазона, крайние неполные — из сырых записей, обрезанных по start и end."""
+        full_start = -(-start // interval) * interval
+        full_end = end // interval * interval
+        if full_start >= full_end:
+            yield from self._raw_bars(pair_id, start, end)
+            return
+
+        yield from self._raw_bars(pair_id, start, full_start, until=full_start)
+
+        folder = self.directory / "rollups" / str(interval)
+        first = self._rollup_path(interval, max(full_start, 0)).stem
+        last = self._rollup_path(interval, max(full_end - interval, 0)).stem
+        for path in sorted(folder.glob("*.ohlc")):
+            if not first <= path.stem <= last:
+                continue
+            for (bucket, pid), (o, h, low, c, n) in sorted(self._read_bars(path).items()):
+                if pid == pair_id and full_start <= bucket < full_end:
+                    yield bucket, o, h, low, c, n
+
+        yield from self._raw_bars(pair_id, full_end, end)
+
+    def _raw_bars(self, pair_id: int, start: float, end: float, until: float | None = None):
+        """Сырые записи пары как бары из одного тика; until — исключающая верхняя граница."""
+        for r in self.read_range(start, end, self.pairs[pair_id]):
+            if until is not None and r.timestamp >= until:
+                break
+            yield r.timestamp, r.rate, r.rate, r.rate, r.rate, 1
+
+    def ohlc(self, pair: str, start: float, end: float, interval: int) -> list[dict]:
+        """OHLC-бары пары за [start, end], выровненные по границам interval (UTC).
+
+        В бары попадают только записи из [start, end], в том числе в крайние
+        неполные. Интервалы, кратные суткам или часу, собираются из готовых
+        агрегатов, а неполные часы или сутки по краям — из сырых записей;
+        остальные интервалы — целиком из сырых записей.
+        """
+        self._load_dictionary()
+        pair_id = self.pair_ids.get(pair)
+        if pair_id is None:
+            return []
+
+        if interval % DAY == 0:
+            source = self._rollup_bars(DAY, pair_id, start, end)
+        elif interval % HOUR == 0:
+            source = self._rollup_bars(HOUR, pair_id, start, end)
+        else:
+            source = self._raw_bars(pair_id, start, end)
+
+        bars: list[dict] = []
+        for ts, o, h, low, c, n in source:
+            bucket = int(ts // interval) * interval
+            if bars and bars[-1]["bucket"] == bucket:
+                bar = bars[-1]
+                bar["high"] = max(bar["high"], h)
+                bar["low"] = min(bar["low"], low)
+                bar["close"] = c
+                bar["count"] += n
+            else:
+                bars.append({
+                    "bucket": bucket,
+                    "open": o,
+                    "high": h,
+                    "low": low,
+                    "close": c,
+                    "count": n,
+                })
+
+        return [
+            {
+                "start": datetime.fromtimestamp(bar.pop("bucket"), timezone.utc).isoformat(),
+                **bar,
+            }
+            for bar in bars
+        ]
+
+    def read_range(
+        self, start: float, end: float, pair: str | None = None
+    ) -> Iterator[HistoryRecord]:
+        """Записи с start <= timestamp <= end; сегменты читаются через mmap."""
+        self._load_dictionary()
+        pair_id = None
+        if pair is not None:
+            pair_id = self.pair_ids.get(pair)
+            if pair_id is None:
+                return
+
+        for path in self.segments(start, end):
+            if path.stat().st_size < RECORD.size:
+                continue
+
+            with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                timestamps = _SegmentTimestamps(mm)
+                lo = bisect_left(timestamps, start)
+                hi = bisect_right(timestamps, end)
+
+                for i in range(lo, hi):
+                    ts, pid, rate, sid = RECORD.unpack_from(mm, i * RECORD.size)
+                    if pair_id is not None and pid != pair_id:
+                        continue
+                    yield HistoryRecord(ts, self.pairs[pid], rate, self.sources[sid])
+
+    def segments(self, start: float, end: float) -> list[Path]:
+        first_day = self._day(max(start, 0))
+        last_day = self._day(max(end, 0))
+        return [
+            path for path in sorted(self.directory.glob("*.bin"))
+            if first_day <= path.stem <= last_day
+        ]
+
+    def import_legacy(self, path: Path) -> int:
+        """Переносит записи из старого exchange_rates.json."""
+        with Path(path).open("r", encoding="utf-8") as f:
+            legacy = json.load(f)
+
+        records = [
+            HistoryRecord(
+                timestamp=datetime.fromisoformat(r["timestamp"]).timestamp(),
+                pair=f"{r['from_currency']}_{r['to_currency']}",
+                rate=float(r["rate"]),
+                source=r["source"],
+            )
+            for r in legacy
+        ]
+        records.sort(key=lambda r: r.timestamp)
+        self.append(records)
+        return len(records)
+
+    def is_empty(self) -> bool:
+        return not any(self.directory.glob("*.bin"))
@@ -0,0 +1,93 @@
+import random
+import threading
+import time
+
+from valutatrade_hub.core.exceptions import LockBusyError
+from valutatrade_hub.infra.settings import SettingsLoader
+from valutatrade_hub.parser_service.config import ParserConfig
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+
+class RatesScheduler:
+    """Фоновое обновление курсов до истечения RATES_TTL_SECONDS.
+
+    Расписание ведётся отдельно для каждого источника, и в каждом цикле
+    опрашиваются только те, чей срок подошёл. После успешного обновления
+    источник планируется не позже чем через SCHEDULE_REFRESH_RATIO * TTL
+    (разброс только в меньшую сторону), после ошибки — с экспоненциальной
+    задержкой, которая тоже не превышает этого интервала: упавший источник
+    не задерживает здоровые, а его курсы не устаревают из-за роста задержки.
+    """
+
+    def __init__(self, source: str | None = None, config: ParserConfig | None = None):
+        self.source = source
+        self.config = config or ParserConfig()
+        self.ttl = int(SettingsLoader().get("RATES_TTL_SECONDS", 300))
+        self.failures: dict[str, int] = {}
+        self.next_run: dict[str, float] = {}
+        self._stop = threading.Event()
+
+    @property
+    def refresh_interval(self) -> float:
+        return self.ttl * self.config.SCHEDULE_REFRESH_RATIO
+
+    def refresh_delay(self) -> float:
+        spread = self.config.SCHEDULE_JITTER
+        return self.refresh_interval * (1 - random.uniform(0, spread))
+
+    def backoff_delay(self, attempts: int) -> float:
+        spread = self.config.SCHEDULE_JITTER
+        cap = min(self.config.BACKOFF_MAX_SECONDS, self.refresh_interval)
+        backoff = self.config.BACKOFF_BASE_SECONDS * 2 ** (attempts - 1)
+        return min(cap, backoff * (1 + random.uniform(-spread, spread)))
+
+    def run_once(self, now: float | None = None) -> dict:
+        """Опрашивает источники, срок которых подошёл, и планирует их следующий запуск."""
+        now = time.monotonic() if now is None else now
+        updater = RatesUpdater.build_rates_updater(self.source)
+        updater.clients = [
+            client for client in updater.clients
+            if self.next_run.get(client.__class__.__name__, now) <= now
+        ]
+        result = updater.run_update()
+
+        for client in updater.clients:
+            name = client.__class__.__name__
+            if name in result["failed"]:
+                self.failures[name] = self.failures.get(name, 0) + 1
+                self.next_run[name] = now + self.backoff_delay(self.failures[name])
+            else:
+                self.failures[name] = 0
+                self.next_run[name] = now + self.refresh_delay()
+
+        return result
+
+    def next_delay(self) -> float:
+        """Пауза до ближайшего источника, срок которого подойдёт первым."""
+        if not self.next_run:
+            return 0.0
+        return max(0.0, min(self.next_run.values()) - time.monotonic())
+
+    def run(self) -> None:
+        with RatesUpdater.lock():
+            while not self._stop.is_set():
+                result = self.run_once()
+                delay = self.next_delay()
+                print(
+                    f"[DAEMON] Обновлено курсов: {result['updated']}. "
+                    f"Следующее обновление через {delay:.0f} с"
+                )
+                self._stop.wait(delay)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def run_daemon(source: str | None = None) -> None:
+    scheduler = RatesScheduler(source)
+    try:
+        scheduler.run()
+    except LockBusyError:
+        print("Обновление курсов уже запущено другим процессом для этого DATA_DIR.")
+    except KeyboardInterrupt:
+        print("\nОбновление курсов остановлено.")
@@ -3,14 +3,16 @@ from pathlib import Path
 from datetime import datetime, timezone
 from typing import Dict, List
 
+from valutatrade_hub.infra.rate_snapshot import SNAPSHOT_FILENAME, RateEntry, RateSnapshot
+from valutatrade_hub.parser_service.history import HistoryRecord, HistoryStore
+
 
 class RatesStorage:
-    def __init__(self, rates_path: str, history_path: str):
+    def __init__(self, rates_path: str, history_dir: str, legacy_history_path: str | None = None):
         self.rates_path = Path(rates_path)
-        self.history_path = Path(history_path)
 
         self.rates_path.parent.mkdir(parents=True, exist_ok=True)
-        self.history_path.parent.mkdir(parents=True, exist_ok=True)
+        self.history = HistoryStore(history_dir)
 
         if not self.rates_path.exists():
             self._atomic_write(self.rates_path, {
@@ -18,8 +20,17 @@ class RatesStorage:
                 "last_refresh": None,
             })
 
-        if not self.history_path.exists():
-            self._atomic_write(self.history_path, [])
+        # бинарный снимок для читателей (RateService, show-rates) рядом с rates.json;
+        # пересобирается из rates.json, если его нет или он записан по другому реестру валют
+        self.snapshot = RateSnapshot(self.rates_path.with_name(SNAPSHOT_FILENAME))
+        if not self.snapshot.is_current():
+            data = self.read_snapshot()
+            self._write_binary(data.get("pairs", {}), data.get("last_refresh"))
+
+        if legacy_history_path is not None:
+            legacy = Path(legacy_history_path)
+            if legacy.exists() and legacy.stat().st_size > 2 and self.history.is_empty():
+                self.history.import_legacy(legacy)
 
     def _atomic_write(self, path: Path, data) -> None:
         tmp_path = path.with_suffix(path.suffix + ".tmp")
@@ -27,12 +38,15 @@ class RatesStorage:
         with tmp_path.open("w", encoding="utf-8") as tmp:
             json.dump(data, tmp, ensure_ascii=False, indent=2)
 
-        if path.exists():
-            path.unlink()
-
+        # replace атомарен: читатель видит либо старый, либо новый файл
         tmp_path.replace(path)
 
-
+    def read_snapshot(self) -> Dict[str, object]:
+        try:
+            with self.rates_path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"pairs": {}, "last_refresh": None}
 
     def write_snapshot(self, pairs: Dict[str, Dict[str, object]]) -> None:
         snapshot = {
@@ -40,13 +54,55 @@ class RatesStorage:
             "last_refresh": datetime.now(timezone.utc).isoformat()
         }
         self._atomic_write(self.rates_path, snapshot)
+        self._write_binary(pairs, snapshot["last_refresh"])
 
-    def append_history(self, records: List[Dict[str, object]]) -> None:
-        if not records:
-            return
+    def _write_binary(self, pairs: Dict[str, Dict[str, object]], last_refresh: str | None) -> None:
+        self.snapshot.write(
+            [
+                RateEntry(
+                    pair,
+                    float(entry["rate"]),
+                    datetime.fromisoformat(entry["updated_at"]).timestamp(),
+                    entry.get("source", ""),
+                )
+                for pair, entry in pairs.items()
+            ],
+            datetime.fromisoformat(last_refresh).timestamp() if last_refresh else None,
+        )
 
-        with self.history_path.open("r", encoding="utf-8") as f:
-            history = json.load(f)
+    def merge_snapshot(
+        self, updates: Dict[str, Dict[str, object]], epsilon: float = 1e-6
+    ) -> List[str]:
+        """Вливает свежие пары в rates.json и возвращает пары, курс которых изменился.
 
-        history.extend(records)
-        self._atomic_write(self.history_path, history)
+        Пары, которых нет в updates (например, источник не ответил), остаются
+        со своими курсом и updated_at. Если курс сдвинулся не больше чем на
+        epsilon (относительно прежнего), сохраняется прежнее значение, а
+        обновляется только updated_at — источник подтвердил курс.
+        """
+        pairs = self.read_snapshot().get("pairs", {})
+        changed = []
+
+        for pair, entry in updates.items():
+            old = pairs.get(pair)
+            if old is not None and old.get("source") == entry["source"]:
+                old_rate = float(old["rate"])
+                if abs(float(entry["rate"]) - old_rate) <= epsilon * abs(old_rate):
+                    pairs[pair] = {**old, "updated_at": entry["updated_at"]}
+                    continue
+            pairs[pair] = entry
+            changed.append(pair)
+
+        self.write_snapshot(pairs)
+        return changed
+
+    def append_history(self, records: List[Dict[str, object]]) -> None:
+        self.history.append([
+            HistoryRecord(
+                timestamp=datetime.fromisoformat(r["timestamp"]).timestamp(),
+                pair=f"{r['from_currency']}_{r['to_currency']}",
+                rate=float(r["rate"]),
+                source=r["source"],
+            )
+            for r in records
+        ])
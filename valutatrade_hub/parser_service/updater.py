@@ -1,72 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 
 from valutatrade_hub.core.exceptions import ApiRequestError
+from valutatrade_hub.infra.locking import FileLock
+from valutatrade_hub.infra.settings import SettingsLoader
 from valutatrade_hub.parser_service.storage import RatesStorage
 
 from valutatrade_hub.parser_service.api_clients import (
     CoinGeckoClient,
     ExchangeRateApiClient,
+    HttpCache,
 )
 from valutatrade_hub.parser_service.config import ParserConfig
 
 class RatesUpdater:
-    def __init__(self, clients: list, storage: RatesStorage):
+    def __init__(
+        self,
+        clients: list,
+        storage: RatesStorage,
+        deadline: float | None = None,
+        epsilon: float = 1e-6,
+    ):
         self.clients = clients
         self.storage = storage
+        self.deadline = deadline
+        self.epsilon = epsilon
 
-    def run_update(self) -> dict:
-        all_rates = {}
-        history_records = []
+    def _fetch_all(self) -> tuple[list[tuple[str, dict]], list[str]]:
+        """Опрашивает все источники параллельно с общим дедлайном.
 
-        now = datetime.now(timezone.utc).isoformat()
+        Источники, не уложившиеся в дедлайн или вернувшие ошибку, пропускаются,
+        результаты остальных сохраняются.
+        """
+        if not self.clients:
+            return [], []
+
+        pool = ThreadPoolExecutor(max_workers=len(self.clients))
+        futures = {pool.submit(client.fetch_rates): client for client in self.clients}
+        _, not_done = wait(futures, timeout=self.deadline)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        results = []
+        failed = []
+        for future, client in futures.items():
+            source_name = client.__class__.__name__
+
+            if future in not_done:
+                print(f"[ERROR] {source_name}: превышено время ожидания ({self.deadline} с)")
+                failed.append(source_name)
+                continue
 
-        for client in self.clients:
             try:
-                rates = client.fetch_rates()
+                rates = future.result()
             except ApiRequestError as e:
                 print(f"[ERROR] {e}")
+                failed.append(source_name)
                 continue
 
-            source_name = client.__class__.__name__
+            results.append((source_name, rates))
 
-            for pair, rate in rates.items():
-                history_records.append(
-                    {
-                        "id": f"{pair}_{now}",
-                        "from_currency": pair.split("_")[0],
-                        "to_currency": pair.split("_")[1],
-                        "rate": rate,
-                        "timestamp": now,
-                        "source": source_name,
-                    }
-                )
+        return results, failed
 
+    def run_update(self) -> dict:
+        """Опрашивает источники и вливает их курсы в снимок.
+
+        В историю попадают только пары, курс которых изменился больше чем
+        на RATE_CHANGE_EPSILON, поэтому её объём растёт с движением рынка,
+        а не с частотой опроса.
+        """
+        all_rates = {}
+        history_records = []
+
+        now = datetime.now(timezone.utc).isoformat()
+
+        results, failed = self._fetch_all()
+
+        for source_name, rates in results:
+            for pair, rate in rates.items():
                 all_rates[pair] = {
                     "rate": rate,
                     "updated_at": now,
                     "source": source_name,
                 }
 
+        changed = []
         if all_rates:
-            self.storage.write_snapshot(all_rates)
+            changed = self.storage.merge_snapshot(all_rates, self.epsilon)
+
+            for pair in changed:
+                from_currency, to_currency = pair.split("_")
+                history_records.append(
+                    {
+                        "id": f"{pair}_{now}",
+                        "from_currency": from_currency,
+                        "to_currency": to_currency,
+                        "rate": all_rates[pair]["rate"],
+                        "timestamp": now,
+                        "source": all_rates[pair]["source"],
+                    }
+                )
             self.storage.append_history(history_records)
 
         return {
             "updated": len(all_rates),
+            "changed": len(changed),
             "last_refresh": now,
+            "failed": failed,
         }
+
+    @staticmethod
+    def lock() -> FileLock:
+        """Блокировка, гарантирующая один процесс обновления курсов на DATA_DIR."""
+        data_dir = SettingsLoader().get("DATA_DIR")
+        return FileLock(data_dir / "updater.lock", blocking=False)
     
     @staticmethod
     def build_rates_updater(source: str | None):
+        """Собирает обновлятор; вызывать под lock(): хранилище при создании пишет снимки курсов."""
         cfg = ParserConfig()
-        storage = RatesStorage(cfg.RATES_FILE_PATH, cfg.HISTORY_FILE_PATH)
+        storage = RatesStorage(cfg.RATES_FILE_PATH, cfg.HISTORY_DIR_PATH, cfg.HISTORY_FILE_PATH)
 
+        # один кеш на все клиенты: они обновляют общий http_cache.json
+        cache = HttpCache(cfg.HTTP_CACHE_FILE_PATH)
         clients = []
 
         if source in (None, "coingecko"):
-            clients.append(CoinGeckoClient(cfg))
+            clients.append(CoinGeckoClient(cfg, cache))
 
         if source in (None, "exchangerate"):
-            clients.append(ExchangeRateApiClient(cfg))
+            clients.append(ExchangeRateApiClient(cfg, cache))
 
-        return RatesUpdater(clients, storage)
+        return RatesUpdater(
+            clients,
+            storage,
+            deadline=cfg.UPDATE_DEADLINE,
+            epsilon=float(SettingsLoader().get("RATE_CHANGE_EPSILON", 1e-6)),
+        )